@@ -0,0 +1,117 @@
+import time
+import timeit
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+from django.core.management.base import CommandError
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext
+
+from client_portal.common import storage
+
+MB = 1024 * 1024
+
+
+class BenchmarkStorage(storage.BaseS3Storage):
+    '''
+        Storage on a throwaway bucket of the fake S3 started by fakeS3.
+    '''
+    s3Key = 'benchmark'
+    s3Secret = 'benchmark'
+    s3Bucket = 'benchmark'
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolledBack():
+    '''
+        Runs the block in a transaction that is always rolled back, so seeded rows never persist.
+    '''
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback()
+    except Rollback:
+        pass
+
+
+@contextmanager
+def fakeS3(latency=0, bandwidth=None):
+    '''
+        Runs the block against moto's in memory S3, yielding a BenchmarkStorage on a fresh bucket and a
+        Counter of the requests sent by operation name.
+        The in process fake has no network, so latency seconds are slept before every request to stand for
+        the round trip, plus the time to send its body at bandwidth bytes per second per connection.
+    '''
+    try:
+        from moto import mock_aws
+    except ImportError:
+        raise CommandError('moto is required to run the storage benchmarks.')
+
+    with mock_aws():
+        bench = BenchmarkStorage()
+        bench.s3Client.create_bucket(Bucket=bench.s3Bucket,
+                                     CreateBucketConfiguration={'LocationConstraint': storage.S3_REGION.lower()})
+
+        requests = Counter()
+
+        def beforeCall(model, params, **kwargs):
+            requests[model.name] += 1
+
+            delay = latency
+            if bandwidth:
+                delay += (storage.dataSize(params.get('body') or b'') or 0) / bandwidth
+            if delay:
+                time.sleep(delay)
+
+        events = bench.s3Client.meta.events
+        events.register('before-call.s3', beforeCall)
+        try:
+            yield bench, requests
+        finally:
+            events.unregister('before-call.s3', beforeCall)
+
+
+def bestTime(func, repeat=3, setup='pass'):
+    '''
+        Best wall time in seconds of repeat calls to func, with tracing off. setup runs untimed before each.
+    '''
+    return min(timeit.repeat(func, setup=setup, number=1, repeat=repeat))
+
+
+def countQueries(func):
+    '''
+        Number of queries run by a call to func. The query log is reset first, as it is capped and the
+        timed runs may have filled it.
+    '''
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    return len(queries)
+
+
+def peakMemory(func):
+    '''
+        Peak memory in bytes allocated by the python allocators during a call to func, above what was
+        already allocated. Memory mapped and temporary files are not traced.
+    '''
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+
+    try:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        func()
+        return tracemalloc.get_traced_memory()[1] - before
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+
+def megabytes(size):
+    return '%.1f MB' % (size / MB)
@@ -10,6 +10,7 @@ class ExceptionCodes:
     passwordChangeRequired = 'passwordChangeRequired'
     twoFARequired = 'twoFARequired'
     notFound = 'notFound'
+    conflict = 'conflict'
     parseError = 'parseError'
     throttled = 'throttled'
 
@@ -0,0 +1,155 @@
+import os
+import shutil
+import asyncio
+from io import BytesIO
+from tempfile import TemporaryFile
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from client_portal.common.benchmarks import MB, BenchmarkStorage, fakeS3, bestTime, peakMemory, megabytes
+from client_portal.common.storage import AsyncS3Storage, S3TempFile
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the S3 storage against moto's in memory S3, with simulated latency and bandwidth. "
+        "Peak memory is the traced python allocations, including the fake S3's own copy of the data."
+    )
+
+    suites = ('multipart', 'concurrent', 'batch', 'spooling')
+
+    def add_arguments(self, parser):
+        parser.add_argument('suites', nargs='*', help='Suites to run, all by default: %s.' % ', '.join(self.suites))
+        parser.add_argument('--sizes', type=int, nargs='+', help='File sizes in MB.')
+        parser.add_argument('--files', type=int, default=50, help='Files used by the many files suites.')
+        parser.add_argument('--latency', type=float, default=20, help='Milliseconds slept before every request.')
+        parser.add_argument('--bandwidth', type=float, default=100, help='MB/s sent per connection.')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs of every case, the best one is shown.')
+
+    def row(self, label, size, seconds, memory, requests):
+        self.stdout.write('%-24s %8s %9.1f MB/s %12s peak %6d requests' % (
+            label, megabytes(size), size / MB / seconds, megabytes(memory), sum(requests.values())
+        ))
+
+    def run(self, label, size, func, requests, repeat):
+        seconds = bestTime(func, repeat)
+        requests.clear()
+        memory = peakMemory(func)
+        self.row(label, size, seconds, memory, requests)
+
+    def runCalls(self, label, calls, func, requests, repeat, setup=None):
+        seconds = bestTime(func, repeat, setup or 'pass')
+        if setup:
+            setup()
+        requests.clear()
+        func()
+        self.stdout.write('%-24s %8d calls %9.1f calls/s %10.1f ms %6d requests' % (
+            label, calls, calls / seconds, seconds * 1000, sum(requests.values())
+        ))
+
+    def multipart(self, options):
+        '''
+            Single PUT, as uploadFile used to send every file, against the concurrent multipart upload.
+        '''
+        with fakeS3(options['latency'] / 1000, options['bandwidth'] * MB) as (bench, requests):
+            for size in options['sizes'] or (32, 128):
+                payload = os.urandom(size * MB)
+
+                def single():
+                    bench._putObject(Body=BytesIO(payload), ContentType=bench.defaultContentType,
+                                     Key='single', Metadata={})
+
+                def multipart():
+                    bench.uploadFile('multipart', BytesIO(payload))
+
+                self.run('single put', len(payload), single, requests, options['repeat'])
+                self.run('multipart upload', len(payload), multipart, requests, options['repeat'])
+
+    def concurrent(self, options):
+        '''
+            Uploads and downloads of many small files, one after the other through the sync storage
+            against all of them awaited at once through AsyncS3Storage.
+        '''
+        with fakeS3(options['latency'] / 1000, options['bandwidth'] * MB) as (bench, requests):
+            asyncBench = AsyncS3Storage(bench)
+            payload = os.urandom(64 * 1024)
+            names = ['concurrent/%s' % i for i in range(options['files'])]
+
+            def sequential():
+                for name in names:
+                    bench.uploadFile(name, payload)
+                for name in names:
+                    bench.downloadFile(name, stream=False).close()
+
+            async def gathered():
+                await asyncio.gather(*(asyncBench.uploadFile(name, payload) for name in names))
+                files = await asyncio.gather(*(asyncBench.downloadFile(name, stream=False) for name in names))
+                for f in files:
+                    f.close()
+
+            self.runCalls('sync calls', len(names) * 2, sequential, requests, options['repeat'])
+            self.runCalls('async storage', len(names) * 2, lambda: asyncio.run(gathered()), requests,
+                          options['repeat'])
+
+    def batch(self, options):
+        '''
+            HEAD and DELETE of many files one request at a time against headFiles and deleteFiles.
+        '''
+        with fakeS3(options['latency'] / 1000, options['bandwidth'] * MB) as (bench, requests):
+            names = ['batch/%s' % i for i in range(options['files'])]
+
+            def store():
+                for name in names:
+                    bench.uploadFile(name, b'batch')
+
+            def headOne():
+                for name in names:
+                    bench._headObject(Key=name)
+
+            def deleteOne():
+                for name in names:
+                    bench.deleteFile(name)
+
+            store()
+            self.runCalls('single heads', len(names), headOne, requests, options['repeat'])
+            self.runCalls('headFiles', len(names), lambda: bench.headFiles(names), requests, options['repeat'])
+            self.runCalls('single deletes', len(names), deleteOne, requests, options['repeat'], store)
+            self.runCalls('deleteFiles', len(names), lambda: bench.deleteFiles(names), requests, options['repeat'],
+                          store)
+
+    def spooling(self, options):
+        '''
+            Downloaded bodies spooled with copyfileobj into a BytesIO or temporary file, as S3TempFile used to,
+            against the exact size buffer filled in place. Runs locally, no request is sent.
+        '''
+        bench = BenchmarkStorage()
+
+        for size in options['sizes'] or (1, 10, 100):
+            payload = os.urandom(size * MB)
+
+            def copied():
+                if len(payload) > bench.maxMemoryFileSize:
+                    data = TemporaryFile(mode='w+b', prefix='s3temp')
+                else:
+                    data = BytesIO()
+                shutil.copyfileobj(BytesIO(payload), data, 64 * 1024)
+                data.seek(0)
+                data.close()
+
+            def filled():
+                S3TempFile(bench, 'spooling', BytesIO(payload), bench.defaultContentType, len(payload),
+                           None, {}).close()
+
+            self.run('copyfileobj', len(payload), copied, Counter(), options['repeat'])
+            self.run('filled in place', len(payload), filled, Counter(), options['repeat'])
+
+    def handle(self, *args, **options):
+        suites = options['suites'] or self.suites
+        unknown = set(suites).difference(self.suites)
+        if unknown:
+            raise CommandError('Unknown suites: %s' % ', '.join(sorted(unknown)))
+
+        for suite in suites:
+            self.stdout.write(self.style.MIGRATE_HEADING(suite))
+            getattr(self, suite)(options)
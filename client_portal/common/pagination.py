@@ -0,0 +1,93 @@
+from itertools import islice
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+from client_portal.common.renderers import dumps
+from middleware.exceptions import BadRequest
+
+PAGE_SIZE = settings.PAGE_SIZE
+MAX_PAGE_SIZE = settings.MAX_PAGE_SIZE
+EXPORT_CHUNK_SIZE = settings.EXPORT_CHUNK_SIZE
+
+
+def pageParams(request):
+    '''
+        Reads the keyset pagination params from the query string:
+            after: id of the last row of the previous page, missing for the first page
+            limit: page size, up to MAX_PAGE_SIZE
+        Raises BadRequest if they are not valid.
+    '''
+    try:
+        after = request.GET.get('after')
+        after = int(after) if after not in (None, '') else None
+        limit = int(request.GET.get('limit') or PAGE_SIZE)
+    except ValueError:
+        raise BadRequest()
+
+    if limit < 1:
+        raise BadRequest()
+
+    return after, min(limit, MAX_PAGE_SIZE)
+
+
+def isExport(request):
+    return request.GET.get('export') == 'ndjson'
+
+
+def keysetPage(queryset, after, limit):
+    '''
+        Returns the rows with id after the given one, in id order, and the cursor of the next page
+        (None on the last page). The query is an index range scan on the primary key, so its cost doesn't
+        depend on how deep the page is.
+        queryset should be a values() queryset including id.
+    '''
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+
+    # One extra row tells if there is a next page without counting
+    rows = list(queryset.order_by('id')[:limit + 1])
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1]['id']
+    return rows, None
+
+
+def keysetIterator(fetchPage, chunkSize=EXPORT_CHUNK_SIZE):
+    '''
+        Iterates all the rows of fetchPage(after, limit) -> (rows, next), one page at a time.
+    '''
+    after = None
+    while True:
+        rows, after = fetchPage(after, chunkSize)
+        yield from rows
+        if after is None:
+            break
+
+
+def _lines(rows):
+    for row in rows:
+        yield dumps(row) + b'\n'
+
+
+async def _asyncLines(lines, batch=500):
+    # Rows are pulled in batches on the thread owning the db connection, so the cursor is kept and
+    # django doesn't consume the whole sync iterator before sending it.
+    take = sync_to_async(lambda: b''.join(islice(lines, batch)), thread_sensitive=True)
+    while True:
+        chunk = await take()
+        if not chunk:
+            break
+        yield chunk
+
+
+def ndjsonResponse(request, rows):
+    '''
+        Streams rows (an iterator of dicts, e.g. a values().iterator()) as newline delimited json, one row at
+        a time, so memory doesn't depend on the number of rows.
+    '''
+    lines = _lines(rows)
+    # DRF's Request wraps the django one
+    content = _asyncLines(lines) if isinstance(getattr(request, '_request', request), ASGIRequest) else lines
+    return StreamingHttpResponse(content, content_type='application/x-ndjson')
@@ -0,0 +1,37 @@
+from django.db import connections
+from django.db.models.sql import UpdateQuery
+
+
+def updateReturning(queryset, fields, values):
+    '''
+        Runs queryset.update(**values) as a single UPDATE ... RETURNING, supported by postgres and sqlite 3.35+,
+        and returns the updated rows as dicts of fields, like values(*fields) would after the update.
+        queryset should be a plain filter on its model, without slicing nor joins.
+    '''
+    query = queryset.query.chain(UpdateQuery)
+    query.add_update_values(values)
+    sql, params = query.get_compiler(queryset.db).as_sql()
+
+    connection = connections[queryset.db]
+    modelFields = [queryset.model._meta.get_field(name) for name in fields]
+    columns = [field.get_col(queryset.model._meta.db_table) for field in modelFields]
+    # Same conversions values() applies, e.g. sqlite decimals and datetimes
+    converters = [
+        (column, connection.ops.get_db_converters(column) + column.field.get_db_converters(connection))
+        for column in columns
+    ]
+
+    returning = ', '.join(connection.ops.quote_name(field.column) for field in modelFields)
+    with connection.cursor() as cursor:
+        cursor.execute('%s RETURNING %s' % (sql, returning), params)
+        rows = cursor.fetchall()
+
+    results = []
+    for row in rows:
+        result = {}
+        for name, value, (column, functions) in zip(fields, row, converters):
+            for convert in functions:
+                value = convert(value, column, connection)
+            result[name] = value
+        results.append(result)
+    return results
@@ -0,0 +1,41 @@
+import json
+from uuid import UUID
+from decimal import Decimal
+from datetime import date, datetime, time
+
+from django.http import HttpResponse
+
+
+def _default(obj):
+    # Same representation the django serializers used: decimals as strings and iso dates
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    raise TypeError("Object of type %s is not JSON serializable" % type(obj).__name__)
+
+
+# Single compact encoder instance, the C accelerated encoder is used for everything but the types above
+_encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False, default=_default)
+
+
+def dumps(data):
+    '''
+        Encodes data (dicts, lists and values() rows) to json bytes.
+    '''
+    return _encoder.encode(data).encode('utf-8')
+
+
+def jsonResponse(data, status=200, headers=None):
+    '''
+        Writes data as json straight into the response body, skipping DRF renderers.
+        data can also be already encoded bytes, e.g. a cached payload from dumps.
+    '''
+    return HttpResponse(
+        data if isinstance(data, bytes) else dumps(data),
+        status=status,
+        content_type='application/json',
+        headers=headers
+    )
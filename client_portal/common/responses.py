@@ -0,0 +1,93 @@
+import re
+import asyncio
+from functools import partial
+from botocore.exceptions import ClientError
+from django.http import StreamingHttpResponse, HttpResponse, HttpResponseNotModified, Http404
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.http import http_date, parse_http_date_safe
+from datetime import datetime, timezone
+
+from client_portal.common.storage import S3RawFile, getAsyncExecutor, handleException
+
+# S3 only supports a single range per request
+_singleRange = re.compile(r'^bytes=(\d+-\d*|-\d+)$')
+
+
+def _syncChunks(file, chunkSize):
+    try:
+        for chunk in iter(partial(file.read, chunkSize), b''):
+            yield chunk
+    finally:
+        file.close()
+
+
+async def _asyncChunks(file, chunkSize):
+    # Reads run on the storage executor so the event loop is never blocked and only one chunk is held at a time
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            chunk = await loop.run_in_executor(getAsyncExecutor(), file.read, chunkSize)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        await loop.run_in_executor(getAsyncExecutor(), file.close)
+
+
+def fileResponse(storage, request, name, chunkSize=64 * 1024, attachmentName=None):
+    '''
+        Streams a stored file to the client in chunkSize pieces without downloading it first, so memory
+        per request is constant whatever the file size.
+        If-Modified-Since and single Range requests are forwarded to S3, answering 304, 206 or 416 without
+        transferring the whole object.
+        Works under WSGI and ASGI, using an async iterator for the latter.
+
+        Raises Http404 if file not found.
+    '''
+    params = {'Key': name}
+
+    modifiedSince = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    if modifiedSince is not None:
+        params['IfModifiedSince'] = datetime.fromtimestamp(modifiedSince, tz=timezone.utc)
+
+    requestedRange = request.headers.get('Range', '').replace(' ', '')
+    if _singleRange.match(requestedRange):
+        params['Range'] = requestedRange
+
+    try:
+        result = storage._getObject(**params)
+    except ClientError as e:
+        status = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode', None)
+        if status == 304:
+            return HttpResponseNotModified()
+        if status == 404:
+            raise Http404("File not found.")
+        if status == 416:
+            return HttpResponse(status=416)
+
+        handleException(e, "Failed to download file.")
+    except Exception as e:
+        handleException(e, "Failed to download file.")
+
+    file = S3RawFile(storage, name, result['Body'], result["ContentType"], result["ContentLength"],
+                     result["LastModified"], result["Metadata"])
+
+    # DRF's Request wraps the django one
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        content = _asyncChunks(file, chunkSize)
+    else:
+        content = _syncChunks(file, chunkSize)
+
+    response = StreamingHttpResponse(content, content_type=file.contentType, status=206 if 'ContentRange' in result else 200)
+    response['Content-Length'] = str(file.size)
+    response['Last-Modified'] = http_date(file.lastModified.timestamp())
+    response['Accept-Ranges'] = 'bytes'
+
+    if 'ContentRange' in result:
+        response['Content-Range'] = result['ContentRange']
+    if 'ETag' in result:
+        response['ETag'] = result['ETag']
+    if attachmentName:
+        response['Content-Disposition'] = 'attachment; filename="%s"' % attachmentName
+
+    return response
@@ -1,16 +1,25 @@
+import mmap
+import time
+import hmac
 import boto3
-import shutil
+import asyncio
+import hashlib
 import mimetypes
 import logging
 from django.conf import settings
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from django.core.files.storage import Storage
 from django.utils.deconstruct import deconstructible
 from rest_framework.exceptions import NotFound
+from uuid import uuid4
 from urllib.parse import quote
 from tempfile import TemporaryFile
 from functools import partial
-from io import BufferedIOBase, BufferedReader, BufferedRandom, BytesIO
+from threading import BoundedSemaphore, Lock
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from io import BufferedIOBase, BufferedReader, BufferedRandom, BytesIO, RawIOBase, SEEK_SET, SEEK_CUR, SEEK_END
 
 from client_portal.common.exceptions import OperationError, ExceptionCodes
 
@@ -21,6 +30,14 @@ S3_SECRET = settings.AWS_SECRET
 UPLOAD_BUCKET = settings.S3_UPLOAD_BUCKET
 S3_REGION = settings.AWS_S3_REGION
 
+# boto3 clients shared by all the storages, by credentials, region and connection settings
+_clients = {}
+_clientsLock = Lock()
+
+# Threads shared by all the async storages to run the blocking boto3 calls, created under _clientsLock
+ASYNC_STORAGE_WORKERS = 32
+_asyncExecutor = None
+
 
 def safeS3Path(path):
     '''
@@ -35,39 +52,147 @@ def safeS3Path(path):
     return "/".join(quote(v) for v in encoded.decode().split('/'))
 
 
+def dataSize(data):
+    '''
+        Returns the number of bytes left to read in data, or None when it can not be known without
+        consuming it (e.g. a non seekable stream).
+    '''
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+
+    try:
+        pos = data.tell()
+        end = data.seek(0, 2)
+        data.seek(pos)
+        return end - pos
+    except Exception:
+        return None
+
+
+def readFully(stream, size):
+    '''
+        Reads up to size bytes from stream, looping over short reads. Only returns less than size at EOF.
+    '''
+    chunk = stream.read(size)
+    if not chunk or len(chunk) == size:
+        return chunk
+
+    parts = [chunk]
+    left = size - len(chunk)
+    while left:
+        chunk = stream.read(left)
+        if not chunk:
+            break
+        parts.append(chunk)
+        left -= len(chunk)
+
+    return b''.join(parts)
+
+
+def getS3Client(key, secret, region, maxPoolConnections, connectTimeout, readTimeout, retryMode, maxAttempts):
+    '''
+        Returns the process wide boto3 S3 client for the given credentials, region and connection settings,
+        creating it on first use. boto3 clients are thread safe so a single one (and its connection pool)
+        is shared by every storage using the same settings.
+    '''
+    clientKey = (key, secret, region, maxPoolConnections, connectTimeout, readTimeout, retryMode, maxAttempts)
+
+    client = _clients.get(clientKey)
+    if client is None:
+        with _clientsLock:
+            client = _clients.get(clientKey)
+            if client is None:
+                client = boto3.client(
+                    's3',
+                    aws_access_key_id=key,
+                    aws_secret_access_key=secret,
+                    region_name=region,
+                    config=Config(
+                        max_pool_connections=maxPoolConnections,
+                        connect_timeout=connectTimeout,
+                        read_timeout=readTimeout,
+                        retries={'mode': retryMode, 'max_attempts': maxAttempts},
+                        tcp_keepalive=True,
+                    )
+                )
+                _clients[clientKey] = client
+
+    return client
+
+
+def allocateBuffer(size, maxMemorySize):
+    '''
+        Returns a writable buffer of exactly size bytes, a bytearray or a memory mapped temporary file
+        when bigger than maxMemorySize.
+    '''
+    if size > maxMemorySize:
+        # The mapping stays valid after the (already unlinked) file is closed
+        with TemporaryFile(mode='w+b', prefix='s3temp') as data:
+            data.truncate(size)
+            return mmap.mmap(data.fileno(), size)
+
+    return bytearray(size)
+
+
+def fillBuffer(stream, view, chunkSize=1024 * 1024):
+    '''
+        Fills the memoryview with data read from stream, using readinto when available so no intermediate
+        bytes objects are created. Raises IOError if the stream ends before filling it.
+    '''
+    readinto = getattr(stream, 'readinto', None)
+    total = len(view)
+    pos = 0
+
+    while pos < total:
+        end = min(pos + chunkSize, total)
+        if readinto is not None:
+            count = readinto(view[pos:end])
+        else:
+            chunk = stream.read(end - pos)
+            count = len(chunk)
+            view[pos:pos + count] = chunk
+
+        if not count:
+            raise IOError("Stream ended after %s of %s bytes." % (pos, total))
+        pos += count
+
+    return pos
+
+
 def handleException(e, reraiseMsg):
     s3logger.critical(reraiseMsg, extra={'extra': str(e)})
     raise OperationError(reraiseMsg, ExceptionCodes.s3Error)
 
 
-class S3StreamWrapper(BufferedIOBase):
+class HashingReader(object):
     '''
-    boto3 S3 stream wrapper that makes it usable with buffered io classes.
-    This stream can not be written to and is not seekable.
+    Read only wrapper that feeds everything read from stream into hasher, so the digest (and the size)
+    is ready once the stream has been consumed once.
     '''
 
-    def __init__(self, body):
-        self.body = body
-        self.read = body.read
-
-    def readable(self): return True
+    def __init__(self, stream, hasher):
+        self.stream = stream
+        self.hasher = hasher
+        self.size = 0
 
-    def close(self):
-        self.body.close()
-        super(S3StreamWrapper, self).close()
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        self.hasher.update(chunk)
+        self.size += len(chunk)
+        return chunk
 
 
-class TempFileWrapper(BufferedIOBase):
+class BufferRaw(RawIOBase):
     '''
-    Buffered temp file wrapper so we can use io classes
+    Raw file over a fixed size buffer (bytearray or mmap) so it can be used with buffered io classes
+    without copying the data into another file object. Can not grow past the buffer size.
     '''
 
-    def __init__(self, raw):
-        self.raw = raw
-        self.read = raw.read
-        self.write = raw.write
-        self._seek = raw.seek
-        self.tell = raw.tell
+    def __init__(self, buffer):
+        super(BufferRaw, self).__init__()
+        self._buffer = buffer
+        self._view = memoryview(buffer)
+        self._pos = 0
 
     def readable(self): return True
 
@@ -75,13 +200,67 @@ class TempFileWrapper(BufferedIOBase):
 
     def seekable(self): return True
 
-    def seek(self, offset, whence=0):
-        self._seek(offset, whence)
-        return self.tell()
+    def readinto(self, b):
+        count = min(len(b), len(self._view) - self._pos)
+        if count <= 0:
+            return 0
+
+        memoryview(b).cast('B')[:count] = self._view[self._pos:self._pos + count]
+        self._pos += count
+        return count
+
+    def write(self, b):
+        data = memoryview(b).cast('B')
+        count = min(len(data), len(self._view) - self._pos)
+        if count <= 0 and len(data):
+            raise IOError("Buffer is full.")
+
+        self._view[self._pos:self._pos + count] = data[:count]
+        self._pos += count
+        return count
+
+    def seek(self, offset, whence=SEEK_SET):
+        if whence == SEEK_SET:
+            pos = offset
+        elif whence == SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == SEEK_END:
+            pos = len(self._view) + offset
+        else:
+            raise ValueError("Invalid whence")
+
+        if pos < 0:
+            raise ValueError("Negative seek position")
+
+        self._pos = pos
+        return pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+            if isinstance(self._buffer, mmap.mmap):
+                self._buffer.close()
+        super(BufferRaw, self).close()
+
+
+class S3StreamWrapper(BufferedIOBase):
+    '''
+    boto3 S3 stream wrapper that makes it usable with buffered io classes.
+    This stream can not be written to and is not seekable.
+    '''
+
+    def __init__(self, body):
+        self.body = body
+        self.read = body.read
+
+    def readable(self): return True
 
     def close(self):
-        self.raw.close()
-        super(TempFileWrapper, self).close()
+        self.body.close()
+        super(S3StreamWrapper, self).close()
 
 
 # Inherit from BufferedReader so it handles all buffering automatically from the wrapper.
@@ -118,6 +297,127 @@ class S3RawFile(BufferedReader):
         return res
 
 
+class S3LazyFile(RawIOBase):
+    '''
+    Read only, seekable S3 file that only downloads the parts being read using range requests.
+    Fetched blocks are kept in a small LRU cache and sequential reads prefetch the following blocks
+    in the same request, so reading headers or a zip directory doesn't download the whole file.
+    Will provide properties from s3:
+        name, size, contentType, lastModified, meta
+    '''
+
+    def __init__(self, storage, name, contentType, size, lastModified, meta, etag):
+        super(S3LazyFile, self).__init__()
+        self.storage = storage
+
+        self.key = name
+        self.size = size
+        self.contentType = contentType
+        self.lastModified = lastModified
+        self.meta = meta
+        self.etag = etag
+
+        self._blockSize = storage.lazyBlockSize
+        self._cacheBlocks = storage.lazyCacheBlocks
+        self._prefetchBlocks = storage.lazyPrefetchBlocks
+        self._blocks = OrderedDict()
+        self._lastBlock = None
+        self._pos = 0
+
+    # For some reason can override the name property
+    @property
+    def name(self):
+        return self.key
+
+    def readable(self): return True
+
+    def seekable(self): return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=SEEK_SET):
+        if whence == SEEK_SET:
+            pos = offset
+        elif whence == SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError("Invalid whence")
+
+        if pos < 0:
+            raise ValueError("Negative seek position")
+
+        self._pos = pos
+        return pos
+
+    def readinto(self, b):
+        view = memoryview(b).cast('B')
+        written = 0
+
+        while written < len(view) and self._pos < self.size:
+            index, start = divmod(self._pos, self._blockSize)
+            block = self._getBlock(index)
+
+            count = min(len(block) - start, len(view) - written)
+            view[written:written + count] = block[start:start + count]
+            written += count
+            self._pos += count
+
+        return written
+
+    def _getBlock(self, index):
+        block = self._blocks.get(index)
+
+        if block is not None:
+            self._blocks.move_to_end(index)
+        else:
+            # Sequential reads fetch the next blocks on the same request
+            count = 1 + self._prefetchBlocks if self._lastBlock is not None and index == self._lastBlock + 1 else 1
+            start = index * self._blockSize
+            end = min(start + count * self._blockSize, self.size) - 1
+
+            try:
+                result = self.storage._getObject(Key=self.key, Range='bytes=%d-%d' % (start, end), IfMatch=self.etag)
+                try:
+                    data = result['Body'].read()
+                finally:
+                    result['Body'].close()
+            except Exception as e:
+                # Includes 412 when the object changed since it was opened
+                handleException(e, "Failed to download file range.")
+
+            # A short block would never let readinto reach the requested size
+            if len(data) != end - start + 1:
+                raise IOError("Range %s-%s of %s returned %s bytes." % (start, end, self.key, len(data)))
+
+            for i in range(0, len(data), self._blockSize):
+                self._blocks[index + i // self._blockSize] = data[i:i + self._blockSize]
+                self._blocks.move_to_end(index + i // self._blockSize)
+
+            while len(self._blocks) > self._cacheBlocks:
+                self._blocks.popitem(last=False)
+
+            block = data[:self._blockSize]
+
+        self._lastBlock = index
+        return block
+
+    def close(self):
+        self._blocks.clear()
+        super(S3LazyFile, self).close()
+
+    def toTemp(self):
+        '''
+        returns a S3TempFile version of this file, reading it whole from the start.
+        '''
+        self.seek(0)
+        res = S3TempFile(self.storage, self.name, self, self.contentType, self.size, self.lastModified, self.meta)
+        self.close()
+        return res
+
+
 class S3TempFile(BufferedRandom):
     '''
     S3 file downloaded to a temporary local file, making it seekable
@@ -125,22 +425,26 @@ class S3TempFile(BufferedRandom):
         name, size, contentType, lastModified, meta
     '''
 
-    def __init__(self, storage, name, stream, contentType, size, lastModified, meta):
+    def __init__(self, storage, name, stream, contentType, size, lastModified, meta, data=None):
+        '''
+        data can be an already filled BufferRaw, in which case stream is ignored.
+        '''
         self.storage = storage
 
-        # Do memory/tempfile spooling here since we now the file size beforehand
-        # so we don't have the overhead of a spooled file with auto roll
+        # Do memory/tempfile spooling here since we now the file size beforehand.
+        # The exact size is allocated once and filled in place, so there is no reallocation nor
+        # intermediate copies. Files bigger than maxMemoryFileSize are memory mapped to a temp file.
 
-        if size > storage.maxMemoryFileSize:
-            data = TemporaryFile(mode='w+b', prefix='s3temp')
-            shutil.copyfileobj(stream, data, 64 * 1024)  # Use a bigger buffer size
-            data.seek(0)
-            super(S3TempFile, self).__init__(TempFileWrapper(data))
-        else:
-            data = BytesIO()
-            shutil.copyfileobj(stream, data, 64 * 1024)  # Use a bigger buffer size
-            data.seek(0)
-            super(S3TempFile, self).__init__(data)
+        if data is None:
+            buffer = allocateBuffer(size, storage.maxMemoryFileSize)
+            data = BufferRaw(buffer)
+            try:
+                fillBuffer(stream, data._view)
+            except Exception:
+                data.close()
+                raise
+
+        super(S3TempFile, self).__init__(data)
 
         self.key = name
         self.size = size
@@ -154,6 +458,81 @@ class S3TempFile(BufferedRandom):
         return self.key
 
 
+class S3UrlSigner(object):
+    '''
+        Generates SigV4 presigned GET urls locally, without going through boto3 request signing.
+        The derived signing key only changes once a day so it's kept until the date changes.
+
+        Urls are cached by (key, expires, disposition) and the same url is returned while more than
+        cacheFraction of its expiration time remains.
+    '''
+
+    def __init__(self, key, secret, bucket, region, cacheFraction=0.5, cacheSize=10000):
+        self.key = key
+        self.secret = secret
+        self.region = region
+        self.host = "{0}.s3.{1}.amazonaws.com".format(bucket, region)
+        self.cacheFraction = cacheFraction
+        self.cacheSize = cacheSize
+
+        self._scopeSuffix = "/{0}/s3/aws4_request".format(region)
+        # (date, key), replaced as a whole so concurrent signers never mix a key with another day
+        self._signing = (None, None)
+        self._cache = {}
+
+    def _getSigningKey(self, date):
+        signingDate, signingKey = self._signing
+        if date != signingDate:
+            signingKey = ("AWS4" + self.secret).encode('utf-8')
+            for part in (date, self.region, 's3', 'aws4_request'):
+                signingKey = hmac.new(signingKey, part.encode('utf-8'), hashlib.sha256).digest()
+
+            self._signing = (date, signingKey)
+
+        return signingKey
+
+    def sign(self, name, expires, disposition=None):
+        now = time.time()
+        cacheKey = (name, expires, disposition)
+
+        cached = self._cache.get(cacheKey)
+        if cached is not None and cached[1] - now > expires * self.cacheFraction:
+            return cached[0]
+
+        amzDate = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(now))
+        date = amzDate[:8]
+
+        params = {
+            'X-Amz-Algorithm': 'AWS4-HMAC-SHA256',
+            'X-Amz-Credential': self.key + '/' + date + self._scopeSuffix,
+            'X-Amz-Date': amzDate,
+            'X-Amz-Expires': str(expires),
+            'X-Amz-SignedHeaders': 'host',
+        }
+        if disposition:
+            params['response-content-disposition'] = disposition
+
+        query = "&".join(
+            quote(k, safe='-_.~') + '=' + quote(v, safe='-_.~') for k, v in sorted(params.items())
+        )
+        path = '/' + quote(name.encode('utf-8') if isinstance(name, str) else name, safe='/-_.~')
+
+        canonicalRequest = "GET\n{0}\n{1}\nhost:{2}\n\nhost\nUNSIGNED-PAYLOAD".format(path, query, self.host)
+        stringToSign = "AWS4-HMAC-SHA256\n{0}\n{1}{2}\n{3}".format(
+            amzDate, date, self._scopeSuffix, hashlib.sha256(canonicalRequest.encode('utf-8')).hexdigest()
+        )
+        signature = hmac.new(self._getSigningKey(date), stringToSign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+        url = "https://{0}{1}?{2}&X-Amz-Signature={3}".format(self.host, path, query, signature)
+
+        # Simple bound, entries are cheap to rebuild
+        if len(self._cache) >= self.cacheSize:
+            self._cache.clear()
+        self._cache[cacheKey] = (url, now + expires)
+
+        return url
+
+
 @deconstructible
 class BaseS3Storage(Storage):
     '''
@@ -176,8 +555,45 @@ class BaseS3Storage(Storage):
     defaultContentType = "application/octet-stream"
 
     urlExpiration = 60 * 60 * 24  # 1 day in seconds. Can be either None or False for no expiration links.
+    urlCacheFraction = 0.5  # Signed urls are reused while more than this fraction of their expiration remains
+    urlCacheSize = 10000
     maxMemoryFileSize = 1024 * 1024 * 10  # 10mb max in memory size for downloaded files, will fallback to temp file
 
+    # Uploads bigger than the threshold (or of unknown size) are sent as multipart uploads.
+    # At most multipartConcurrency parts are held in memory at once, each up to multipartChunkSize.
+    multipartThreshold = 1024 * 1024 * 16  # 16mb
+    multipartChunkSize = 1024 * 1024 * 8  # 8mb, S3 requires at least 5mb for every part but the last one
+    multipartConcurrency = 4
+    multipartRetries = 2  # Extra attempts per part before aborting the whole upload
+
+    # S3 copies objects of up to 5gb in a single request, bigger ones are copied by ranges of copyChunkSize
+    maxCopySize = 1024 * 1024 * 1024 * 5  # 5gb
+    copyChunkSize = 1024 * 1024 * 512  # 512mb
+
+    # Non streamed downloads bigger than rangeChunkSize are fetched with rangeConcurrency parallel range requests
+    rangeChunkSize = 1024 * 1024 * 8  # 8mb
+    rangeConcurrency = 4
+
+    # Lazy downloads fetch lazyBlockSize blocks on demand, caching up to lazyCacheBlocks of them
+    lazyBlockSize = 1024 * 256  # 256kb
+    lazyCacheBlocks = 16
+    lazyPrefetchBlocks = 3  # Extra blocks fetched on sequential reads
+
+    headConcurrency = 16  # Parallel HEAD requests done by headFiles
+
+    # Content addressed mode stores every file once under contentAddressedPrefix + its sha256, see uploadFile.
+    # Files stored this way may be shared, so they should not be deleted when a single reference goes away.
+    contentAddressed = False
+    contentAddressedPrefix = 'cas/'
+
+    # Connection settings of the shared client, see getS3Client.
+    # The pool should fit the concurrency settings above across all threads using this storage.
+    maxPoolConnections = 50
+    connectTimeout = 5  # seconds
+    readTimeout = 60  # seconds
+    retryMode = 'standard'  # |'legacy'|'adaptive'
+    maxAttempts = 3
+
     # ---------------------
 
     # The storage class can not have sensitive data on its constructor because it goes into migrations otherwise.
@@ -189,12 +605,39 @@ class BaseS3Storage(Storage):
         # Store locally for faster lookups
         self.s3Bucket = self.s3Bucket
 
-        self.s3Client = boto3.client('s3', aws_access_key_id=self.s3Key, aws_secret_access_key=self.s3Secret,
-                                     region_name=S3_REGION)
+        # Content addressed keys known to be stored, see _digestExists
+        self._knownDigests = set()
 
-        # Save function locally to improve performance
-        self._generateSignedUrl = partial(self.s3Client.generate_presigned_url, 'get_object')
+        self._publicUrl = "https://{0}.s3.amazonaws.com/".format(self.s3Bucket) + "{0}"
+        self._signer = S3UrlSigner(self.s3Key, self.s3Secret, self.s3Bucket, S3_REGION,
+                                   cacheFraction=self.urlCacheFraction, cacheSize=self.urlCacheSize)
+
+        if self.urlExpiration:
+            self._getUrl = partial(self.getPrivateUrl, expires=self.urlExpiration)
+
+        else:
+            self._getUrl = self.getPublicUrl
 
+    # Attributes created by _connect on first use, so storages instantiated at import time don't build clients
+    _clientAttributes = frozenset((
+        's3Client', '_putObject', '_createMultipartUpload', '_uploadPart', '_uploadPartCopy',
+        '_completeMultipartUpload', '_abortMultipartUpload', '_getObject', '_deleteObject', '_deleteObjects',
+        '_headObject', '_copyObject',
+    ))
+
+    def __getattr__(self, name):
+        # Only called when the attribute is missing
+        if name not in self._clientAttributes:
+            raise AttributeError(name)
+
+        self._connect()
+        return self.__dict__[name]
+
+    def _connect(self):
+        self.s3Client = getS3Client(self.s3Key, self.s3Secret, S3_REGION, self.maxPoolConnections,
+                                    self.connectTimeout, self.readTimeout, self.retryMode, self.maxAttempts)
+
+        # Save function locally to improve performance
         self._putObject = partial(
             self.s3Client.put_object,
             ACL=self.acl,
@@ -203,23 +646,48 @@ class BaseS3Storage(Storage):
             StorageClass=self.storageClass
 
         )
+        self._createMultipartUpload = partial(
+            self.s3Client.create_multipart_upload,
+            ACL=self.acl,
+            Bucket=self.s3Bucket,
+            CacheControl=self.cacheControl,
+            StorageClass=self.storageClass
+        )
+        self._uploadPart = partial(self.s3Client.upload_part, Bucket=self.s3Bucket)
+        self._uploadPartCopy = partial(self.s3Client.upload_part_copy, Bucket=self.s3Bucket)
+        self._completeMultipartUpload = partial(self.s3Client.complete_multipart_upload, Bucket=self.s3Bucket)
+        self._abortMultipartUpload = partial(self.s3Client.abort_multipart_upload, Bucket=self.s3Bucket)
         self._getObject = partial(self.s3Client.get_object, Bucket=self.s3Bucket)
         self._deleteObject = partial(self.s3Client.delete_object, Bucket=self.s3Bucket)
+        self._deleteObjects = partial(self.s3Client.delete_objects, Bucket=self.s3Bucket)
         self._headObject = partial(self.s3Client.head_object, Bucket=self.s3Bucket)
-        self._publicUrl = "https://{0}.s3.amazonaws.com/".format(self.s3Bucket) + "{0}"
-
-        if self.urlExpiration:
-            self._getUrl = partial(self.getPrivateUrl, expires=self.urlExpiration)
-
-        else:
-            self._getUrl = self.getPublicUrl
+        self._copyObject = partial(
+            self.s3Client.copy_object,
+            ACL=self.acl,
+            Bucket=self.s3Bucket,
+            CacheControl=self.cacheControl,
+            StorageClass=self.storageClass
+        )
 
     def uploadFile(self, name, data, meta=None):
         '''
             Uploads a file to S3 given its complete name and this storage bucket.
             data can be either a file like object or a byte string
             meta should be a k,v dict
+
+            Files bigger than multipartThreshold, or streams whose size can not be known, are uploaded
+            in parts concurrently. See multipartUpload.
+
+            Returns the key the file was stored at, which is not name when contentAddressed is set.
         '''
+        if self.contentAddressed:
+            return self._uploadContentAddressed(name, data, meta)
+
+        size = dataSize(data)
+
+        if size is None or size > self.multipartThreshold:
+            return self.multipartUpload(name, data, meta)
+
         try:
             self._putObject(
                 Body=data,
@@ -230,13 +698,207 @@ class BaseS3Storage(Storage):
         except Exception as e:
             handleException(e, "Failed to upload file.")
 
-    def downloadFile(self, name, stream=True):
+        return name
+
+    def contentAddressedKey(self, name, digest):
+        # Keep the extension so the content type can still be guessed from the key
+        ext = name.rsplit('.', 1)[1] if '.' in name.rsplit('/', 1)[-1] else None
+        return self.contentAddressedPrefix + digest[:2] + '/' + digest + ('.' + ext if ext else '')
+
+    def _digestExists(self, key):
+        '''
+            Checks if a content addressed key is already stored, first on the local index and then with a HEAD.
+        '''
+        if key in self._knownDigests:
+            return True
+
+        try:
+            self._headObject(Key=key)
+        except ClientError as e:
+            if e.response.get('ResponseMetadata', {}).get('HTTPStatusCode', None) == 404:
+                return False
+            raise
+
+        self._knownDigests.add(key)
+        return True
+
+    def _uploadContentAddressed(self, name, data, meta):
+        '''
+            Stores data once by its sha256, returning its canonical key.
+            Byte strings, and seekable streams up to multipartThreshold which are read into memory, are hashed
+            up front and not sent at all if already stored.
+            Bigger streams are hashed while they are uploaded to a staging key, which is then either discarded or
+            copied to the canonical key server side, so the data is only read once. Copies over maxCopySize are
+            done by ranges, see _copyLarge.
+        '''
+        try:
+            if not isinstance(data, (bytes, bytearray)):
+                size = dataSize(data)
+                if size is not None and size <= self.multipartThreshold:
+                    data = readFully(data, size)
+
+            if isinstance(data, (bytes, bytearray)):
+                key = self.contentAddressedKey(name, hashlib.sha256(data).hexdigest())
+                if not self._digestExists(key):
+                    self._putObject(
+                        Body=data,
+                        ContentType=mimetypes.guess_type(name, strict=False)[0] or self.defaultContentType,
+                        Key=key,
+                        Metadata=meta or {},
+                    )
+                    self._knownDigests.add(key)
+                return key
+
+            hasher = hashlib.sha256()
+            reader = HashingReader(data, hasher)
+            stagingKey = self.contentAddressedPrefix + 'staging/' + uuid4().hex
+            try:
+                self.multipartUpload(stagingKey, reader, meta)
+
+                key = self.contentAddressedKey(name, hasher.hexdigest())
+                if not self._digestExists(key):
+                    contentType = mimetypes.guess_type(name, strict=False)[0] or self.defaultContentType
+                    if reader.size > self.maxCopySize:
+                        self._copyLarge(stagingKey, key, reader.size, contentType, meta)
+                    else:
+                        self._copyObject(
+                            CopySource={'Bucket': self.s3Bucket, 'Key': stagingKey},
+                            Key=key,
+                            ContentType=contentType,
+                            Metadata=meta or {},
+                            MetadataDirective='REPLACE',
+                        )
+                    self._knownDigests.add(key)
+            finally:
+                self._deleteObject(Key=stagingKey)
+
+            return key
+        except OperationError:
+            raise
+        except Exception as e:
+            handleException(e, "Failed to upload file.")
+
+    def _copyLarge(self, source, key, size, contentType, meta):
+        '''
+            Copies source to key server side as a multipart upload of copyChunkSize ranges, copied concurrently
+            on multipartConcurrency threads. Aborts the upload if any range fails.
+        '''
+        uploadId = self._createMultipartUpload(ContentType=contentType, Key=key, Metadata=meta or {})['UploadId']
+
+        def copyPart(partNumber):
+            start = (partNumber - 1) * self.copyChunkSize
+            end = min(start + self.copyChunkSize, size) - 1
+            res = self._uploadPartCopy(
+                Key=key, UploadId=uploadId, PartNumber=partNumber,
+                CopySource={'Bucket': self.s3Bucket, 'Key': source},
+                CopySourceRange='bytes=%s-%s' % (start, end),
+            )
+            return {'PartNumber': partNumber, 'ETag': res['CopyPartResult']['ETag']}
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.multipartConcurrency) as executor:
+                parts = list(executor.map(copyPart, range(1, -(-size // self.copyChunkSize) + 1)))
+
+            self._completeMultipartUpload(Key=key, UploadId=uploadId, MultipartUpload={'Parts': parts})
+        except Exception:
+            try:
+                self._abortMultipartUpload(Key=key, UploadId=uploadId)
+            except Exception as abortError:
+                s3logger.error("Failed to abort multipart copy.", extra={'extra': str(abortError)})
+            raise
+
+    def multipartUpload(self, name, data, meta=None):
+        '''
+            Uploads a file to S3 as a multipart upload.
+            Parts are read sequentially from data and uploaded on a pool of multipartConcurrency threads.
+            Reading blocks while all the pool slots are busy, so memory stays bounded to
+            multipartConcurrency * multipartChunkSize regardless of the file size.
+
+            Each part is retried multipartRetries times, so a failure only resends that part. If a part
+            still fails the upload is aborted so S3 doesn't keep the orphan parts around.
+        '''
+        if isinstance(data, (bytes, bytearray)):
+            data = BytesIO(data)
+
+        try:
+            uploadId = self._createMultipartUpload(
+                ContentType=mimetypes.guess_type(name, strict=False)[0] or self.defaultContentType,
+                Key=name,
+                Metadata=meta or {},
+            )['UploadId']
+        except Exception as e:
+            handleException(e, "Failed to upload file.")
+
+        slots = BoundedSemaphore(self.multipartConcurrency)
+        futures = []
+
+        def release(future):
+            slots.release()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.multipartConcurrency) as executor:
+                partNumber = 1
+                while True:
+                    slots.acquire()
+
+                    # Stop reading as soon as a part fails, the upload will be aborted anyway
+                    if any(f.done() and f.exception() for f in futures):
+                        slots.release()
+                        break
+
+                    chunk = readFully(data, self.multipartChunkSize)
+
+                    # S3 needs at least one part, even if empty
+                    if not chunk and partNumber > 1:
+                        slots.release()
+                        break
+
+                    future = executor.submit(self._sendPart, name, uploadId, partNumber, chunk)
+                    future.add_done_callback(release)
+                    futures.append(future)
+
+                    if len(chunk) < self.multipartChunkSize:
+                        break
+                    partNumber += 1
+
+            parts = [f.result() for f in futures]
+
+            self._completeMultipartUpload(Key=name, UploadId=uploadId, MultipartUpload={'Parts': parts})
+        except Exception as e:
+            try:
+                self._abortMultipartUpload(Key=name, UploadId=uploadId)
+            except Exception as abortError:
+                s3logger.error("Failed to abort multipart upload.", extra={'extra': str(abortError)})
+
+            handleException(e, "Failed to upload file.")
+
+        return name
+
+    def _sendPart(self, name, uploadId, partNumber, chunk):
+        '''
+            Uploads a single part retrying it up to multipartRetries times.
+            Returns the part info needed to complete the upload.
+        '''
+        attempt = 0
+        while True:
+            try:
+                res = self._uploadPart(Key=name, UploadId=uploadId, PartNumber=partNumber, Body=chunk)
+                return {'PartNumber': partNumber, 'ETag': res['ETag']}
+            except Exception as e:
+                if attempt >= self.multipartRetries:
+                    raise
+                attempt += 1
+                s3logger.warning("Retrying multipart upload part.", extra={'extra': "%s part %s: %s" % (name, partNumber, e)})
+
+    def downloadFile(self, name, stream=True, lazy=False):
         '''
             Downloads a file from s3 returning a S3RawFile or S3TempFile instance
                 depending on the stream flag.
             stream:
                 if True, will download the whole file into a temporary location making it seekable and closing the connection
                 if False, file is streamed directly from S3 but is not seekable and connection remains open
+            lazy:
+                if True, returns a seekable S3LazyFile that only downloads the ranges being read. Takes precedence over stream.
 
             The caller is responsable to correctly close the returned data object
 
@@ -244,17 +906,18 @@ class BaseS3Storage(Storage):
         '''
 
         try:
-            result = self._getObject(Key=name)
+            if lazy:
+                result = self._headObject(Key=name)
+                return S3LazyFile(self, name, result["ContentType"], result["ContentLength"],
+                                  result["LastModified"], result["Metadata"], result["ETag"])
 
-            if stream:
-                res = S3RawFile(self, name, result['Body'], result["ContentType"], result["ContentLength"],
-                                result["LastModified"], result["Metadata"])
-            else:
-                res = S3TempFile(self, name, result['Body'], result["ContentType"], result["ContentLength"],
-                                 result["LastModified"], result["Metadata"])
-                result["Body"].close()
+            if not stream:
+                return self._rangedDownload(name)
 
-            return res
+            result = self._getObject(Key=name)
+
+            return S3RawFile(self, name, result['Body'], result["ContentType"], result["ContentLength"],
+                             result["LastModified"], result["Metadata"])
 
         except ClientError as e:
             if 'ResponseMetadata' in e.response:
@@ -267,6 +930,64 @@ class BaseS3Storage(Storage):
         except Exception as e:
             handleException(e, "Failed to download file.")
 
+    def _rangedDownload(self, name):
+        '''
+            Downloads a whole file into a S3TempFile.
+            The first rangeChunkSize bytes are requested alone, which also tells the total size. Small files are
+            done after that single request, bigger ones fetch the rest of the chunks concurrently, each one
+            written straight into its offset of a preallocated buffer or temporary file.
+        '''
+        try:
+            first = self._getObject(Key=name, Range='bytes=0-%d' % (self.rangeChunkSize - 1))
+        except ClientError as e:
+            # Empty files can not satisfy any range
+            if e.response.get('Error', {}).get('Code') != 'InvalidRange':
+                raise
+
+            result = self._getObject(Key=name)
+            res = S3TempFile(self, name, result['Body'], result["ContentType"], result["ContentLength"],
+                             result["LastModified"], result["Metadata"])
+            result["Body"].close()
+            return res
+
+        size = int(first['ContentRange'].rsplit('/', 1)[1])
+
+        if size <= self.rangeChunkSize:
+            res = S3TempFile(self, name, first['Body'], first["ContentType"], size,
+                             first["LastModified"], first["Metadata"])
+            first["Body"].close()
+            return res
+
+        data = BufferRaw(allocateBuffer(size, self.maxMemoryFileSize))
+
+        # Pin the following ranges to the same version of the object
+        etag = first['ETag']
+
+        def fetch(offset):
+            end = min(offset + self.rangeChunkSize, size)
+            result = self._getObject(Key=name, Range='bytes=%d-%d' % (offset, end - 1), IfMatch=etag)
+            try:
+                # Chunks don't overlap so each thread fills its own slice
+                fillBuffer(result['Body'], data._view[offset:end])
+            finally:
+                result['Body'].close()
+
+        try:
+            try:
+                fillBuffer(first['Body'], data._view[:self.rangeChunkSize])
+            finally:
+                first['Body'].close()
+
+            with ThreadPoolExecutor(max_workers=self.rangeConcurrency) as executor:
+                # list() so errors from any chunk are raised here
+                list(executor.map(fetch, range(self.rangeChunkSize, size, self.rangeChunkSize)))
+        except Exception:
+            data.close()
+            raise
+
+        return S3TempFile(self, name, None, first["ContentType"], size, first["LastModified"], first["Metadata"],
+                          data=data)
+
     def getPublicUrl(self, name):
         '''
             No checks are done if file doesn't exist.
@@ -274,11 +995,13 @@ class BaseS3Storage(Storage):
         # return self.generateSignedUrl(Params = {"Bucket":self.s3Bucket, "Key":name}, ExpiresIn=31536000) #1 year
         return self._publicUrl.format(safeS3Path(name))
 
-    def getPrivateUrl(self, name, expires):
+    def getPrivateUrl(self, name, expires, disposition=None):
         '''
             Signed url for private files with expires in seconds.
+            disposition sets the response Content-Disposition header when given.
+            Signing is done locally and cached, see S3UrlSigner.
         '''
-        return self._generateSignedUrl(Params={"Bucket": self.s3Bucket, "Key": name}, ExpiresIn=expires)
+        return self._signer.sign(name, expires, disposition)
 
     def deleteFile(self, name):
         '''
@@ -288,3 +1011,121 @@ class BaseS3Storage(Storage):
             self._deleteObject(Key=name)
         except Exception as e:
             handleException(e, "Failed to delete file.")
+
+        self._knownDigests.discard(name)
+
+    def deleteFiles(self, names):
+        '''
+            Deletes many files using a single request for every 1000 of them (S3 limit).
+            Returns a dict with the names that failed and their error message, empty if all were deleted.
+        '''
+        names = list(names)
+        errors = {}
+
+        try:
+            for i in range(0, len(names), 1000):
+                result = self._deleteObjects(Delete={
+                    'Objects': [{'Key': name} for name in names[i:i + 1000]],
+                    'Quiet': True,  # Only errors are returned
+                })
+
+                for error in result.get('Errors', []):
+                    errors[error['Key']] = error.get('Message') or error.get('Code')
+        except Exception as e:
+            handleException(e, "Failed to delete files.")
+
+        # Failed deletes may still be stored, so they are forgotten too and checked again on upload
+        self._knownDigests.difference_update(names)
+
+        if errors:
+            s3logger.error("Failed to delete some files.", extra={'extra': str(errors)})
+
+        return errors
+
+    def headFiles(self, names):
+        '''
+            Gets the metadata of many files running the HEAD requests concurrently on up to headConcurrency threads.
+            Returns a dict by name with either:
+                {size, contentType, lastModified, meta} or None if the file was not found.
+        '''
+        def head(name):
+            try:
+                result = self._headObject(Key=name)
+            except ClientError as e:
+                if e.response.get('ResponseMetadata', {}).get('HTTPStatusCode', None) == 404:
+                    return name, None
+                raise
+
+            return name, {
+                'size': result['ContentLength'],
+                'contentType': result['ContentType'],
+                'lastModified': result['LastModified'],
+                'meta': result['Metadata'],
+            }
+
+        names = list(names)
+        if not names:
+            return {}
+
+        try:
+            with ThreadPoolExecutor(max_workers=min(self.headConcurrency, len(names))) as executor:
+                return dict(executor.map(head, names))
+        except Exception as e:
+            handleException(e, "Failed to get files info.")
+
+
+def getAsyncExecutor():
+    '''
+        Returns the process wide executor used by AsyncS3Storage, creating it on first use.
+    '''
+    global _asyncExecutor
+    if _asyncExecutor is None:
+        with _clientsLock:
+            if _asyncExecutor is None:
+                _asyncExecutor = ThreadPoolExecutor(max_workers=ASYNC_STORAGE_WORKERS, thread_name_prefix='s3async')
+    return _asyncExecutor
+
+
+class AsyncS3Storage(object):
+    '''
+        Asyncio counterpart of a BaseS3Storage instance to be used from async views under ASGI.
+        Blocking S3 calls run on a shared thread pool through the wrapped storage, so they reuse its
+        client, connection pool and bound defaults (ACL, CacheControl, StorageClass) without stalling
+        the event loop, and many of them can be awaited at once.
+    '''
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    async def _run(self, func, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(getAsyncExecutor(), partial(func, *args, **kwargs))
+
+    async def uploadFile(self, name, data, meta=None):
+        return await self._run(self.storage.uploadFile, name, data, meta)
+
+    async def downloadFile(self, name, stream=True, lazy=False):
+        '''
+            Same as BaseS3Storage.downloadFile. Reading a returned S3RawFile or S3LazyFile still blocks,
+            use stream=False to get the whole file before returning.
+        '''
+        return await self._run(self.storage.downloadFile, name, stream, lazy)
+
+    async def deleteFile(self, name):
+        return await self._run(self.storage.deleteFile, name)
+
+    async def deleteFiles(self, names):
+        return await self._run(self.storage.deleteFiles, names)
+
+    async def headFiles(self, names):
+        return await self._run(self.storage.headFiles, names)
+
+    # Urls are signed locally without any IO, so the url helpers are plain methods
+
+    def getPrivateUrl(self, name, expires, disposition=None):
+        return self.storage.getPrivateUrl(name, expires, disposition)
+
+    def getUrl(self, name):
+        return self.storage._getUrl(name)
+
+    def getPublicUrl(self, name):
+        return self.storage.getPublicUrl(name)
@@ -0,0 +1,5 @@
+from django.apps import AppConfig
+
+
+class Api(AppConfig):
+    name = 'client_portal.idempotency'
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from client_portal.idempotency import services as idempotency_services
+
+
+class Command(BaseCommand):
+    help = 'Deletes the expired idempotency keys.'
+
+    def handle(self, *args, **options):
+        purged = idempotency_services.purge_expired()
+        self.stdout.write(self.style.SUCCESS('Deleted %s keys.' % purged))
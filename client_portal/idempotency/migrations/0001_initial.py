@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('status', models.PositiveSmallIntegerField(null=True)),
+                ('content_type', models.CharField(max_length=255, null=True)),
+                ('body', models.BinaryField(null=True)),
+                ('expires', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires'], name='idempotency_key_expires_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import models
+
+
+class IdempotencyKey(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    # sha256 of the user, method, path and Idempotency-Key header, only one request runs per key
+    key = models.CharField(max_length=64, unique=True)
+    # sha256 of the request body, a key can't be reused for another request
+    fingerprint = models.CharField(max_length=64)
+    # Response to replay, empty until the request finishes
+    status = models.PositiveSmallIntegerField(null=True)
+    content_type = models.CharField(max_length=255, null=True)
+    body = models.BinaryField(null=True)
+    expires = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires'], name='idempotency_key_expires_idx'),
+        ]
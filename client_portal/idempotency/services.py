@@ -0,0 +1,29 @@
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+
+from client_portal.jobs import queue
+from client_portal.idempotency.models import IdempotencyKey
+
+IDEMPOTENCY_KEY_TTL = settings.IDEMPOTENCY_KEY_TTL
+
+PURGE_KEYS_TASK = 'idempotency.purge_expired'
+
+
+def purge_expired(batch=1000):
+    """Deletes the expired keys, batch rows per query, and returns how many were deleted."""
+    purged = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expires__lte=timezone.now()).values_list('id', flat=True)[:batch])
+        if not ids:
+            return purged
+        purged += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+
+
+def schedule_purge():
+    """Queues a purge for the keys stored this hour, once they expired. Keys of the same hour share the job."""
+    now = timezone.now()
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    run_at = hour + timedelta(hours=1, seconds=IDEMPOTENCY_KEY_TTL)
+    queue.enqueue(PURGE_KEYS_TASK, key='%s:%s' % (PURGE_KEYS_TASK, hour.isoformat()),
+                  delay=(run_at - now).total_seconds())
@@ -0,0 +1,7 @@
+from client_portal.jobs.queue import task
+from client_portal.idempotency import services as idempotency_services
+
+
+@task(idempotency_services.PURGE_KEYS_TASK)
+def purge_expired():
+    idempotency_services.purge_expired()
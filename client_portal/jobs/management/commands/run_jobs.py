@@ -0,0 +1,53 @@
+import signal
+import threading
+import multiprocessing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils.module_loading import autodiscover_modules
+
+from client_portal.jobs import queue
+
+JOB_WORKERS = settings.JOB_WORKERS
+
+
+class Command(BaseCommand):
+    help = 'Runs the queued jobs with a pool of worker processes until interrupted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=JOB_WORKERS, help='Worker processes to run.')
+        parser.add_argument('--batch', type=int, default=queue.JOB_BATCH_SIZE, help='Jobs claimed per query.')
+        parser.add_argument('--poll-interval', type=float, default=queue.JOB_POLL_INTERVAL,
+                            help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Run the due jobs and exit.')
+
+    def handle(self, *args, **options):
+        processes = max(options['processes'], 1)
+        work = dict(limit=options['batch'], poll_interval=options['poll_interval'], once=options['once'])
+        # Registers the @task functions declared in each app's tasks module
+        autodiscover_modules('tasks')
+
+        if processes == 1:
+            stop = threading.Event()
+            self.stop_on_signals(stop)
+            queue.work(stop, **work)
+            return
+
+        # Workers are forked so they share the loaded apps, each opens its own db connection
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+        connections.close_all()
+        workers = [context.Process(target=queue.work, args=(stop,), kwargs=work, daemon=True) for _ in range(processes)]
+        self.stop_on_signals(stop)
+        for worker in workers:
+            worker.start()
+        self.stdout.write('Started %s job workers.' % processes)
+        for worker in workers:
+            worker.join()
+
+    @staticmethod
+    def stop_on_signals(stop):
+        # Jobs in progress are finished before exiting
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
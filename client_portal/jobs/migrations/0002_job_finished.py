@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:09
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def set_finished(apps, schema_editor):
+    # Jobs finished before the field existed are kept for a full retention period from now
+    apps.get_model('jobs', 'Job').objects.filter(status__in=['done', 'failed']).update(finished=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='finished',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(condition=models.Q(('finished__isnull', False)), fields=['finished'], name='job_finished_idx'),
+        ),
+        migrations.RunPython(set_finished, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+from django.db import models
+from django.utils import timezone
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Job(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    task = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict)
+    # Enqueueing the same key twice keeps the first job
+    key = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=7, default=PENDING, choices=[
+        (PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')
+    ])
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True)
+    last_error = models.TextField(null=True)
+    created = models.DateTimeField(default=timezone.now)
+    # When it was done or failed, finished jobs are deleted after JOB_RETENTION
+    finished = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            # Workers poll for due jobs, the partial indexes only hold the ones still to run
+            models.Index(fields=['run_at'], name='job_pending_idx', condition=models.Q(status=PENDING)),
+            models.Index(fields=['locked_at'], name='job_running_idx', condition=models.Q(status=RUNNING)),
+            models.Index(fields=['finished'], name='job_finished_idx', condition=models.Q(finished__isnull=False)),
+        ]
@@ -0,0 +1,145 @@
+import time
+import random
+import logging
+import traceback
+from datetime import timedelta
+from uuid import uuid4
+from django.conf import settings
+from django.db import DatabaseError, transaction, close_old_connections
+from django.utils import timezone
+
+from client_portal.jobs.models import Job, PENDING, RUNNING, DONE, FAILED
+
+JOB_BATCH_SIZE = settings.JOB_BATCH_SIZE
+JOB_POLL_INTERVAL = settings.JOB_POLL_INTERVAL
+JOB_MAX_ATTEMPTS = settings.JOB_MAX_ATTEMPTS
+JOB_RETRY_DELAY = settings.JOB_RETRY_DELAY
+JOB_MAX_RETRY_DELAY = settings.JOB_MAX_RETRY_DELAY
+JOB_LOCK_TIMEOUT = settings.JOB_LOCK_TIMEOUT
+JOB_RETENTION = settings.JOB_RETENTION
+JOB_PURGE_INTERVAL = settings.JOB_PURGE_INTERVAL
+
+joblogger = logging.getLogger('jobs')
+
+_tasks = {}
+
+
+def task(name):
+    """
+    Registers the decorated function as the task name, called with the job payload as keyword arguments.
+    Jobs are run at least once, so tasks must be idempotent.
+    """
+    def register(function):
+        _tasks[name] = function
+        return function
+    return register
+
+
+def enqueue(name, payload=None, key=None, delay=0, max_attempts=JOB_MAX_ATTEMPTS):
+    """
+    Queues a job in the current transaction, so workers only see it once the caller commits.
+    If a job with the same key was already queued it's kept and nothing is added, until it's finished and
+    purged after JOB_RETENTION.
+    """
+    Job.objects.bulk_create([Job(
+        task=name,
+        payload=payload or {},
+        key=key or uuid4().hex,
+        max_attempts=max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )], ignore_conflicts=True)
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that failed attempts times: exponential, capped and jittered."""
+    delay = min(JOB_RETRY_DELAY * 2 ** (attempts - 1), JOB_MAX_RETRY_DELAY)
+    return delay * random.uniform(0.5, 1)
+
+
+def claim(limit=JOB_BATCH_SIZE):
+    """
+    Marks up to limit due jobs as running and returns them.
+    Rows locked by other workers are skipped (SELECT ... FOR UPDATE SKIP LOCKED), so concurrent workers never
+    claim the same job nor wait on each other. SQLite has no row locks, the clause is left out there.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(Job.objects.select_for_update(skip_locked=True).filter(
+            status=PENDING, run_at__lte=now
+        ).order_by('run_at')[:limit])
+        if jobs:
+            Job.objects.filter(id__in=[job.id for job in jobs]).update(status=RUNNING, locked_at=now)
+    return jobs
+
+
+def release_stale():
+    """Queues again the jobs left running by a worker that died, after JOB_LOCK_TIMEOUT."""
+    return Job.objects.filter(
+        status=RUNNING, locked_at__lt=timezone.now() - timedelta(seconds=JOB_LOCK_TIMEOUT)
+    ).update(status=PENDING, locked_at=None)
+
+
+def run(job):
+    """Runs a claimed job, then marks it done or schedules its retry, failing it after max_attempts."""
+    attempts = job.attempts + 1
+    try:
+        function = _tasks.get(job.task)
+        if function is None:
+            raise LookupError('Unknown task %s' % job.task)
+        function(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        joblogger.error("Job %s (%s) failed on attempt %s.", job.id, job.task, attempts, exc_info=True)
+        if attempts >= job.max_attempts:
+            Job.objects.filter(id=job.id).update(
+                status=FAILED, attempts=attempts, locked_at=None, last_error=error, finished=timezone.now()
+            )
+        else:
+            Job.objects.filter(id=job.id).update(
+                status=PENDING, attempts=attempts, locked_at=None, last_error=error,
+                run_at=timezone.now() + timedelta(seconds=backoff(attempts)),
+            )
+        return False
+
+    Job.objects.filter(id=job.id).update(status=DONE, attempts=attempts, locked_at=None, finished=timezone.now())
+    return True
+
+
+def purge_finished(batch=1000):
+    """Deletes the jobs done or failed more than JOB_RETENTION ago, batch rows per query, returning how many."""
+    cutoff = timezone.now() - timedelta(seconds=JOB_RETENTION)
+    purged = 0
+    while True:
+        ids = list(Job.objects.filter(finished__lt=cutoff).values_list('id', flat=True)[:batch])
+        if not ids:
+            return purged
+        purged += Job.objects.filter(id__in=ids).delete()[0]
+
+
+def work(stop, limit=JOB_BATCH_SIZE, poll_interval=JOB_POLL_INTERVAL, once=False):
+    """
+    Claims and runs jobs until stop (a threading or multiprocessing Event) is set, waiting poll_interval
+    seconds whenever the queue is empty. With once, returns as soon as there are no due jobs.
+    Idle workers also purge the finished jobs every JOB_PURGE_INTERVAL seconds.
+    """
+    purged = None
+    while not stop.is_set():
+        close_old_connections()
+        try:
+            jobs = claim(limit)
+        except DatabaseError:
+            # Lost connection or a locked sqlite file, try again on the next poll
+            joblogger.warning("Failed to claim jobs.", exc_info=True)
+            stop.wait(poll_interval)
+            continue
+        for job in jobs:
+            run(job)
+        if not jobs:
+            if release_stale():
+                continue
+            if purged is None or time.monotonic() - purged > JOB_PURGE_INTERVAL:
+                purge_finished()
+                purged = time.monotonic()
+            if once:
+                break
+            stop.wait(poll_interval)
@@ -0,0 +1,55 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from client_portal.common.benchmarks import rolledBack, bestTime, countQueries
+from client_portal.orders import services as order_services
+from client_portal.products.models import Product, ProductVariant
+from client_portal.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks placing orders with create_order for carts of different sizes, half of the items with a '
+        'variant. Seeded rows and placed orders are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, nargs='+', default=[1, 10, 100], help='Items per cart.')
+        parser.add_argument('--orders', type=int, default=200, help='Orders placed per run.')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs of every case, the best one is shown.')
+
+    def seed(self, count):
+        products = Product.objects.bulk_create([
+            Product(name='benchmark-%s' % i, base_price=Decimal('10.00'), description='benchmark')
+            for i in range(count)
+        ], batch_size=1000)
+        variants = ProductVariant.objects.bulk_create([
+            ProductVariant(product_id=product, name='variant', price=Decimal('12.50'), description='benchmark')
+            for product in products
+        ], batch_size=1000)
+        client = User.objects.create(username='benchmark-client', password='-', name='benchmark')
+        return client, products, variants
+
+    def handle(self, *args, **options):
+        with rolledBack():
+            client, products, variants = self.seed(max(options['items']))
+
+            for size in options['items']:
+                data = {
+                    'address_street': 'benchmark',
+                    'address_number': '1',
+                    'items': [
+                        {'product_id': products[i].id, 'variant_id': variants[i].id if i % 2 else None, 'quantity': 2}
+                        for i in range(size)
+                    ],
+                }
+
+                def place():
+                    order_services.create_order(client, data)
+
+                seconds = bestTime(lambda: [place() for _ in range(options['orders'])], options['repeat'])
+                queries = countQueries(place)
+                self.stdout.write('%4d items %10.2f ms/order %8.0f orders/s %3d queries/order' % (
+                    size, seconds / options['orders'] * 1000, options['orders'] / seconds, queries
+                ))
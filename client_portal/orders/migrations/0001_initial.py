@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('products', '0002_live_indexes'),
+        ('users', '0002_live_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('currency', models.CharField(choices=[('UYU', 'Pesos'), ('USD', 'US Dollars')], max_length=3)),
+                ('address_street', models.CharField(max_length=127)),
+                ('address_number', models.CharField(max_length=63)),
+                ('address_extra', models.CharField(max_length=255, null=True)),
+                ('client_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='users.user')),
+                ('products', models.ManyToManyField(to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['client_id', 'id'], name='order_client_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+def backfill_summary(apps, schema_editor):
+    # Orders placed before the summary existed only know their products, not the quantities
+    Order = apps.get_model('orders', 'Order')
+    for order in Order.objects.prefetch_related('products').iterator(chunk_size=500):
+        names = [product.name for product in order.products.all()]
+        Order.objects.filter(id=order.id).update(item_count=len(names), product_names=names)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='product_names',
+            field=models.JSONField(default=list),
+        ),
+        migrations.RunPython(backfill_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_order_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='processed',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
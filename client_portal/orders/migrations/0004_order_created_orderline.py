@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:54
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_processed'),
+        ('products', '0002_live_indexes'),
+    ]
+
+    operations = [
+        # Orders had no creation time, existing ones get the migration time. It is not meaningful for them, so
+        # the revenue rollups skip them, see reports.0002_skip_legacy_orders
+        migrations.AddField(
+            model_name='order',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('order_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='orders.order')),
+                ('product_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_lines', to='products.product')),
+                ('variant_id', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_lines', to='products.productvariant')),
+            ],
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
+from django.utils import timezone
 from client_portal.users.models import User
-from client_portal.products.models import Product
+from client_portal.products.models import Product, ProductVariant
 
 
 class Order(models.Model):
@@ -12,3 +13,25 @@ class Order(models.Model):
     address_extra = models.CharField(max_length=255, null=True)
     client_id = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
     products = models.ManyToManyField(Product)
+    # Summary stored at write time, so the order history doesn't need to join the products
+    item_count = models.PositiveIntegerField(default=0)
+    product_names = models.JSONField(default=list)
+    # Set by the order processing job
+    processed = models.DateTimeField(null=True)
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Client orders in id order
+            models.Index(fields=['client_id', 'id'], name='order_client_idx'),
+        ]
+
+
+class OrderLine(models.Model):
+    """An item of an order, priced when the order was placed."""
+    id = models.BigAutoField(primary_key=True)
+    order_id = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines')
+    product_id = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='order_lines')
+    variant_id = models.ForeignKey(ProductVariant, on_delete=models.SET_NULL, null=True, related_name='order_lines')
+    quantity = models.PositiveIntegerField()
+    amount = models.DecimalField(decimal_places=2, max_digits=10)
@@ -0,0 +1,24 @@
+from django.conf import settings
+from marshmallow import (
+    Schema,
+    fields,
+    validate,
+)
+
+
+class OrderItemSchema(Schema):
+    product_id = fields.Integer(required=True)
+    variant_id = fields.Integer(required=False, allow_none=True)
+    quantity = fields.Integer(required=False, load_default=1, validate=validate.Range(
+        min=1, max=settings.MAX_ITEM_QUANTITY
+    ))
+
+
+class CreateOrderSchema(Schema):
+    # The catalogue is priced in a single currency, orders can only be placed in it
+    currency = fields.Str(required=False, load_default=settings.CATALOGUE_CURRENCY,
+                          validate=validate.OneOf([settings.CATALOGUE_CURRENCY]))
+    address_street = fields.Str(required=True)
+    address_number = fields.Str(required=True)
+    address_extra = fields.Str(required=False, allow_none=True)
+    items = fields.List(fields.Nested(OrderItemSchema), required=True, validate=validate.Length(min=1))
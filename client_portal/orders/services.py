@@ -0,0 +1,107 @@
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+
+from client_portal.common.pagination import PAGE_SIZE, keysetPage
+from client_portal.jobs import queue
+from client_portal.orders.models import Order, OrderLine
+from client_portal.products.models import Product, ProductVariant
+from client_portal.reports import services as report_services
+from middleware.exceptions import BadRequest
+
+# Fields exposed by the API
+ORDER_FIELDS = ('id', 'price', 'currency', 'address_street', 'address_number', 'address_extra', 'client_id',
+                'item_count', 'product_names', 'processed')
+# Fields of the order history, all stored on the order row
+HISTORY_FIELDS = ('id', 'price', 'currency', 'item_count', 'product_names', 'processed')
+
+PROCESS_ORDER_TASK = 'orders.process_order'
+
+CATALOGUE_CURRENCY = settings.CATALOGUE_CURRENCY
+
+# Largest amount the order price and line amount columns hold
+_price_field = Order._meta.get_field('price')
+MAX_ORDER_PRICE = Decimal(10) ** (_price_field.max_digits - _price_field.decimal_places) - Decimal('0.01')
+
+
+def order_to_dict(order, product_ids):
+    data = {field: getattr(order, 'client_id_id' if field == 'client_id' else field) for field in ORDER_FIELDS}
+    data['products'] = product_ids
+    return data
+
+
+def price_items(items):
+    """
+    Prices the cart items validated by OrderItemSchema with one query for the products and one for the
+    variants, if any. Variants are charged at their price and products at their base price.
+    Returns the total, the products by id and the amount of each item.
+    Raises BadRequest if an item references a missing or deleted product or variant, or if the total doesn't
+    fit MAX_ORDER_PRICE.
+    """
+    products = Product.objects.filter(deleted__isnull=True).in_bulk({item['product_id'] for item in items})
+    variant_ids = {item['variant_id'] for item in items if item.get('variant_id') is not None}
+    variants = ProductVariant.objects.filter(deleted__isnull=True).in_bulk(variant_ids) if variant_ids else {}
+
+    amounts = []
+    for item in items:
+        product = products.get(item['product_id'])
+        if product is None:
+            raise BadRequest()
+        if item.get('variant_id') is not None:
+            variant = variants.get(item['variant_id'])
+            if variant is None or variant.product_id_id != product.id:
+                raise BadRequest()
+            price = variant.price
+        else:
+            price = product.base_price
+        amounts.append(price * item['quantity'])
+
+    total = sum(amounts, Decimal('0'))
+    if total > MAX_ORDER_PRICE:
+        raise BadRequest()
+
+    return total, products, amounts
+
+
+def create_order(client, data):
+    """
+    Places an order for the client: prices the items, then inserts the order, with its history summary, its
+    product rows and lines with a bulk_create each and its processing job, all in one transaction.
+    """
+    items = data['items']
+    # The m2m table holds each product once per order
+    product_ids = list(dict.fromkeys(item['product_id'] for item in items))
+    with transaction.atomic():
+        total, products, amounts = price_items(items)
+
+        order = Order.objects.create(
+            price=total,
+            currency=CATALOGUE_CURRENCY,
+            address_street=data['address_street'],
+            address_number=data['address_number'],
+            address_extra=data.get('address_extra'),
+            client_id_id=client.id,
+            item_count=sum(item['quantity'] for item in items),
+            product_names=[products[product_id].name for product_id in product_ids],
+        )
+
+        Order.products.through.objects.bulk_create([
+            Order.products.through(order_id=order.id, product_id=product_id) for product_id in product_ids
+        ])
+        OrderLine.objects.bulk_create([
+            OrderLine(order_id_id=order.id, product_id_id=item['product_id'], variant_id_id=item.get('variant_id'),
+                      quantity=item['quantity'], amount=amount)
+            for item, amount in zip(items, amounts)
+        ])
+
+        # Processing runs in the job workers, once the order is committed
+        queue.enqueue(PROCESS_ORDER_TASK, {'order_id': order.id}, key='%s:%s' % (PROCESS_ORDER_TASK, order.id))
+        report_services.schedule_refresh()
+
+    return order, product_ids
+
+
+def retrieve_client_orders_page(client_id, after=None, limit=PAGE_SIZE):
+    """Order history of a client, read from the summary columns with a range scan on order_client_idx."""
+    rows, next_cursor = keysetPage(Order.objects.filter(client_id=client_id).values(*HISTORY_FIELDS), after, limit)
+    return {'results': rows, 'next': next_cursor}
@@ -0,0 +1,14 @@
+from django.utils import timezone
+
+from client_portal.jobs.queue import task
+from client_portal.orders.models import Order
+from client_portal.orders.services import PROCESS_ORDER_TASK
+
+
+@task(PROCESS_ORDER_TASK)
+def process_order(order_id):
+    """
+    Work done after an order is placed, out of the request. Only marks the order as processed, stock checks,
+    notifications or invoices go here. Already processed orders are skipped, as jobs may run more than once.
+    """
+    Order.objects.filter(id=order_id, processed__isnull=True).update(processed=timezone.now())
@@ -0,0 +1,56 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from client_portal.orders import services as order_services
+from client_portal.orders.models import Order
+from client_portal.products.models import Product
+from client_portal.users.models import User
+
+
+class CreateOrderTests(TestCase):
+    """Placing orders through the API: currency, bounds, validation and server errors."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='client', password='-', name='Client')
+        self.product = Product.objects.create(name='product', base_price=Decimal('10.00'), description='product')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def order(self, **data):
+        data.setdefault('address_street', 'street')
+        data.setdefault('address_number', '1')
+        data.setdefault('items', [{'product_id': self.product.id, 'quantity': 2}])
+        return self.client.post('/api/orders/', data, format='json')
+
+    def test_charged_in_catalogue_currency(self):
+        response = self.order()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['currency'], order_services.CATALOGUE_CURRENCY)
+        self.assertEqual(Order.objects.get().price, Decimal('20.00'))
+
+    def test_other_currency_is_rejected(self):
+        other = 'UYU' if order_services.CATALOGUE_CURRENCY != 'UYU' else 'USD'
+        self.assertEqual(self.order(currency=other).status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_quantity_is_bounded(self):
+        response = self.order(items=[{'product_id': self.product.id, 'quantity': 10 ** 9}])
+        self.assertEqual(response.status_code, 400)
+
+    def test_total_must_fit_the_price_column(self):
+        Product.objects.filter(id=self.product.id).update(base_price=order_services.MAX_ORDER_PRICE)
+        self.assertEqual(self.order().status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_validation_errors_are_bad_requests(self):
+        self.assertEqual(self.order(items=[]).status_code, 400)
+        self.assertEqual(self.order(items=[{'product_id': 'x'}]).status_code, 400)
+
+    def test_server_errors_are_logged(self):
+        with mock.patch.object(order_services, 'create_order', side_effect=RuntimeError('boom')):
+            with self.assertLogs('client_portal.orders.views', 'ERROR') as logs:
+                self.assertEqual(self.order().status_code, 500)
+        self.assertIn('boom', logs.output[0])
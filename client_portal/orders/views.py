@@ -0,0 +1,51 @@
+import logging
+
+from marshmallow import EXCLUDE, ValidationError
+from rest_framework import viewsets, status
+from rest_framework.response import Response
+
+from middleware import authorizers
+from middleware.exceptions import HttpError
+from middleware.idempotency import idempotent
+from client_portal.common.renderers import jsonResponse
+from client_portal.common.pagination import pageParams
+from client_portal.orders import services as order_services
+from client_portal.orders.schemas import CreateOrderSchema
+
+logger = logging.getLogger(__name__)
+
+
+class Order(viewsets.ViewSet):
+    def get(self, request, **kwargs):
+        try:
+            client_id = request.user.id
+            # Admins can read the history of any client
+            if request.GET.get('client') not in (None, ''):
+                if not authorizers.is_admin(request):
+                    return Response(status=status.HTTP_401_UNAUTHORIZED)
+                try:
+                    client_id = int(request.GET['client'])
+                except ValueError:
+                    return Response(status=status.HTTP_400_BAD_REQUEST)
+            after, limit = pageParams(request)
+            page = order_services.retrieve_client_orders_page(client_id, after, limit)
+            return jsonResponse(page, status=status.HTTP_200_OK)
+        except HttpError as e:
+            return Response(status=e.status_code)
+        except Exception:
+            logger.exception('Unhandled error in %s', request.path)
+            return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @idempotent
+    def create(self, request, **kwargs):
+        try:
+            data = CreateOrderSchema().load(request.data, unknown=EXCLUDE)
+            order, product_ids = order_services.create_order(request.user, data)
+            return jsonResponse(order_services.order_to_dict(order, product_ids), status=status.HTTP_201_CREATED)
+        except ValidationError as e:
+            return Response(e.messages, status=status.HTTP_400_BAD_REQUEST)
+        except HttpError as e:
+            return Response(status=e.status_code)
+        except Exception:
+            logger.exception('Unhandled error in %s', request.path)
+            return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
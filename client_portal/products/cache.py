@@ -0,0 +1,58 @@
+import time
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOGUE_VERSION_KEY = 'products:catalogue:version'
+CATALOGUE_TIMEOUT = 60 * 60 * 24  # 1 day, entries of old versions just expire
+# A local memory cache is per process and only sees the versions bumped by its own process, so entries
+# must expire soon for updates made on other workers to show up
+CATALOGUE_LOCAL_TIMEOUT = 5
+
+if settings.CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+    CATALOGUE_TIMEOUT = CATALOGUE_LOCAL_TIMEOUT
+
+
+def catalogue_version():
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        # Start from a time based value so a lost version key never reuses an old version
+        cache.add(CATALOGUE_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(CATALOGUE_VERSION_KEY)
+    return version
+
+
+def _bump_version():
+    try:
+        cache.incr(CATALOGUE_VERSION_KEY)
+    except ValueError:
+        catalogue_version()
+
+
+def invalidate_catalogue():
+    """Moves the catalogue to a new version once the current transaction commits."""
+    transaction.on_commit(_bump_version)
+
+
+def cached_catalogue(name, build):
+    """
+    Returns (payload, etag) for the catalogue entry name of the current version.
+    build is only called on a miss and must return the json encoded payload as bytes.
+    """
+    key = 'products:catalogue:%s:%s' % (catalogue_version(), name)
+    entry = cache.get(key)
+    if entry is None:
+        payload = build()
+        entry = (payload, '"%s"' % hashlib.md5(payload).hexdigest())
+        cache.set(key, entry, CATALOGUE_TIMEOUT)
+    return entry
+
+
+def etag_matches(request, etag):
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags or 'W/' + etag in tags
@@ -0,0 +1,60 @@
+from decimal import Decimal
+
+from django.core import serializers
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from client_portal.common.benchmarks import rolledBack, bestTime, countQueries, peakMemory, megabytes
+from client_portal.common.renderers import dumps
+from client_portal.products.models import Product, ProductVariant
+from client_portal.products import services as product_services
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks rendering the whole catalogue with the django serializers against values() projections '
+        'and the compact encoder, over seeded products that are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help='Products to seed.')
+        parser.add_argument('--variants', type=int, default=2, help='Variants of every product.')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs of every case, the best one is shown.')
+
+    def seed(self, start, stop, variants):
+        products = Product.objects.bulk_create([
+            Product(name='benchmark-%s' % i, base_price=Decimal('10.00'), description='benchmark')
+            for i in range(start, stop)
+        ], batch_size=1000)
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product_id=product, name='variant-%s' % v, price=Decimal('12.50'), description='benchmark')
+            for product in products for v in range(variants)
+        ], batch_size=1000)
+
+    def run(self, label, size, func, repeat):
+        seconds = bestTime(func, repeat)
+        memory = peakMemory(func)
+        body = func()
+        queries = countQueries(func)
+        self.stdout.write('%-20s %6d products %10.1f ms %12s peak %10s body %3d queries' % (
+            label, size, seconds * 1000, megabytes(memory), megabytes(len(body)), queries
+        ))
+
+    def handle(self, *args, **options):
+        # The django serializers output as the views used to send it, re-encoded as a json string by DRF
+        def serialized():
+            products = Product.objects.filter(deleted__isnull=True).order_by('id')
+            variants = ProductVariant.objects.filter(deleted__isnull=True, product_id__in=products).order_by('id')
+            return JSONRenderer().render(serializers.serialize('json', list(products) + list(variants)))
+
+        def projected():
+            return dumps(product_services.retrieve_product_data())
+
+        with rolledBack():
+            seeded = 0
+            for size in options['sizes']:
+                self.seed(seeded, size, options['variants'])
+                seeded = size
+
+                self.run('django serializers', size, serialized, options['repeat'])
+                self.run('values and dumps', size, projected, options['repeat'])
@@ -0,0 +1,129 @@
+import re
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from client_portal.common.benchmarks import rolledBack
+
+from client_portal.products.models import Product, ProductVariant
+from client_portal.products import services as product_services
+from client_portal.users.models import User
+from client_portal.users import services as user_services
+from client_portal.orders.models import Order
+from client_portal.orders import services as order_services
+from client_portal.jobs.models import Job, PENDING, RUNNING, DONE, FAILED
+from client_portal.jobs.queue import JOB_LOCK_TIMEOUT, JOB_RETENTION
+
+# Full table scans as shown by postgres and sqlite EXPLAIN
+SEQUENTIAL_SCAN = re.compile(r'Seq Scan on (\w+)|\bSCAN (\w+)\s*$', re.MULTILINE)
+
+# Below this many rows per table the planners rightly prefer scanning small tables, so the check would fail
+# (or pass) for reasons unrelated to the indexes
+MIN_ROWS = 10000
+# Seeded orders are spread over this many clients
+SEED_CLIENTS = 100
+
+
+class Command(BaseCommand):
+    help = 'Runs EXPLAIN on the service queries over a seeded dataset and fails if any does a sequential scan.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000,
+                            help='Products, variants, users, orders and jobs to seed, at least %s.' % MIN_ROWS)
+        parser.add_argument('--no-seed', action='store_true',
+                            help='Explain against the existing data, only meaningful on tables of %s rows or more.'
+                            % MIN_ROWS)
+
+    def queries(self):
+        after = Product.objects.order_by('id').values_list('id', flat=True).first() or 0
+        page_ids = list(Product.objects.filter(deleted__isnull=True, id__gt=after).order_by('id').values_list(
+            'id', flat=True
+        )[:product_services.PAGE_SIZE])
+        user_id = Order.objects.order_by('id').values_list('client_id', flat=True).first() or 0
+        now = timezone.now()
+
+        return [
+            ('product page', Product.objects.filter(deleted__isnull=True).values(
+                *product_services.PRODUCT_FIELDS
+            ).filter(id__gt=after).order_by('id')[:product_services.PAGE_SIZE + 1]),
+            ('product by id', Product.objects.filter(deleted__isnull=True, id=after)),
+            ('page variants', ProductVariant.objects.filter(
+                deleted__isnull=True, product_id__in=page_ids
+            ).order_by('id').values(*product_services.VARIANT_FIELDS)),
+            ('variant page', ProductVariant.objects.filter(deleted__isnull=True).values(
+                *product_services.VARIANT_FIELDS
+            ).filter(id__gt=after).order_by('id')[:product_services.PAGE_SIZE + 1]),
+            ('user page', User.objects.filter(deleted__isnull=True).values(
+                *user_services.USER_FIELDS
+            ).filter(id__gt=0).order_by('id')[:product_services.PAGE_SIZE + 1]),
+            ('user by id', User.objects.filter(id=user_id, deleted__isnull=True)),
+            ('client orders', Order.objects.filter(client_id=user_id).values(
+                *order_services.HISTORY_FIELDS
+            ).filter(id__gt=0).order_by('id')[:product_services.PAGE_SIZE + 1]),
+            ('due jobs', Job.objects.filter(status=PENDING, run_at__lte=now).order_by('run_at')[:10]),
+            ('stale jobs', Job.objects.filter(status=RUNNING, locked_at__lt=now - timedelta(seconds=JOB_LOCK_TIMEOUT))),
+            ('purged jobs', Job.objects.filter(finished__lt=now - timedelta(seconds=JOB_RETENTION)).values_list(
+                'id', flat=True
+            )[:1000]),
+        ]
+
+    def seed(self, rows):
+        products = Product.objects.bulk_create([
+            Product(name='plan-check-%s' % i, base_price=Decimal('1.00'), description='plan check')
+            for i in range(rows)
+        ], batch_size=1000)
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product_id=product, name='variant', price=Decimal('1.00'), description='plan check')
+            for product in products
+        ], batch_size=1000)
+        users = User.objects.bulk_create([
+            User(username='plan-check-%s' % i, password='-', name='plan check') for i in range(rows)
+        ], batch_size=1000)
+        Order.objects.bulk_create([
+            Order(price=Decimal('1.00'), currency='USD', address_street='plan check', address_number='1',
+                  client_id=users[i % SEED_CLIENTS], item_count=1, product_names=['plan check'])
+            for i in range(rows)
+        ], batch_size=1000)
+
+        # Like a live queue: mostly finished jobs, some of them past the retention, a few pending or running
+        now = timezone.now()
+        statuses = [DONE] * 16 + [FAILED, PENDING, PENDING, RUNNING]
+        jobs = []
+        for i in range(rows):
+            status = statuses[i % len(statuses)]
+            finished = now - timedelta(seconds=JOB_RETENTION * (i % 3) / 2) if status in (DONE, FAILED) else None
+            jobs.append(Job(
+                task='plan-check', key='plan-check-%s' % i, status=status, finished=finished,
+                run_at=now + timedelta(seconds=i % 7 - 3),
+                locked_at=now - timedelta(seconds=i % 2 * JOB_LOCK_TIMEOUT * 2) if status == RUNNING else None,
+            ))
+        Job.objects.bulk_create(jobs, batch_size=1000)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def handle(self, *args, **options):
+        if not options['no_seed'] and options['rows'] < MIN_ROWS:
+            raise CommandError('--rows must be at least %s for the plans to be meaningful.' % MIN_ROWS)
+
+        failures = []
+        # Seeded rows are always rolled back
+        with rolledBack():
+            if not options['no_seed']:
+                self.seed(options['rows'])
+
+            for name, queryset in self.queries():
+                plan = queryset.explain()
+                scans = [table for match in SEQUENTIAL_SCAN.findall(plan) for table in match if table]
+                if scans:
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR('%s: sequential scan on %s' % (name, ', '.join(scans))))
+                else:
+                    self.stdout.write(self.style.SUCCESS('%s: ok' % name))
+                self.stdout.write(plan)
+
+        if failures:
+            raise CommandError('Sequential scans found in: %s' % ', '.join(failures))
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('deleted__isnull', True)), fields=['id'], name='product_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(condition=models.Q(('deleted__isnull', True)), fields=['id'], name='variant_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(condition=models.Q(('deleted__isnull', True)), fields=['product_id', 'id'], name='variant_product_live_idx'),
+        ),
+    ]
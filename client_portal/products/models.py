@@ -8,6 +8,12 @@ class Product(models.Model):
     description = models.CharField(null=False, max_length=4095, blank=False)
     deleted = models.DateTimeField(null=True)
 
+    class Meta:
+        indexes = [
+            # Every read filters out soft deleted rows, the partial index only holds the live ones
+            models.Index(fields=['id'], name='product_live_idx', condition=models.Q(deleted__isnull=True)),
+        ]
+
 
 class ProductVariant(models.Model):
     id = models.AutoField(primary_key=True)
@@ -19,3 +25,9 @@ class ProductVariant(models.Model):
 
     class Meta:
         unique_together = ('product_id', 'name')
+        indexes = [
+            models.Index(fields=['id'], name='variant_live_idx', condition=models.Q(deleted__isnull=True)),
+            models.Index(
+                fields=['product_id', 'id'], name='variant_product_live_idx', condition=models.Q(deleted__isnull=True)
+            ),
+        ]
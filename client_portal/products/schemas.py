@@ -27,3 +27,15 @@ class UpdateProductVariantSchema(Schema):
     price = fields.Decimal(required=False)
     name = fields.Str(required=False)
     description = fields.Str(required=False)
+
+
+class BulkUpdateProductSchema(UpdateProductSchema):
+    id = fields.Integer(required=True)
+
+
+class BulkUpdateProductVariantSchema(UpdateProductVariantSchema):
+    id = fields.Integer(required=True)
+
+
+class BulkDeleteSchema(Schema):
+    ids = fields.List(fields.Integer(), required=True)
@@ -1,99 +1,387 @@
 from client_portal.products.models import Product, ProductVariant
 from middleware.exceptions import EntityNotFound, Conflict
-from datetime import datetime
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 
+from client_portal.common.exceptions import ExceptionCodes
 
-def retrieve_product(pk=None):
-    products = Product.objects.filter(deleted__isnull=True)
+from client_portal.common.queries import updateReturning
+from client_portal.common.renderers import dumps
+from client_portal.common.pagination import keysetPage, keysetIterator, PAGE_SIZE, EXPORT_CHUNK_SIZE
+from client_portal.products.cache import cached_catalogue, invalidate_catalogue
+
+BULK_BATCH_SIZE = 500
+
+# Fields exposed by the API
+PRODUCT_FIELDS = ('id', 'name', 'base_price', 'description')
+VARIANT_FIELDS = ('id', 'product_id', 'name', 'price', 'description')
+
+
+def product_to_dict(product):
+    return {field: getattr(product, field) for field in PRODUCT_FIELDS}
+
+
+def variant_to_dict(variant):
+    # product_id is the relation itself, its value is stored in product_id_id
+    return {field: getattr(variant, 'product_id_id' if field == 'product_id' else field) for field in VARIANT_FIELDS}
+
+
+def attach_variants(rows):
+    """Adds the non deleted variants to a list of product dicts using a single query."""
+    by_id = {}
+    for row in rows:
+        row['variants'] = []
+        by_id[row['id']] = row
+
+    if rows:
+        variants = ProductVariant.objects.filter(
+            deleted__isnull=True, product_id__in=list(by_id)
+        ).order_by('id').values(*VARIANT_FIELDS)
+        for variant in variants:
+            by_id[variant['product_id']]['variants'].append(variant)
+
+    return rows
+
+
+def products_data(products):
+    """
+    Projects a products queryset into dicts with their non deleted variants, using values() so no model
+    instances are built. Takes two queries whatever the number of products.
+    """
+    return attach_variants(list(products.values(*PRODUCT_FIELDS)))
+
+
+def retrieve_product_data(pk=None):
+    """
+    Non deleted product by pk, or all of them, as dicts with their variants in two queries, see products_data.
+    Raises EntityNotFound if there are none.
+    """
+    products = Product.objects.filter(deleted__isnull=True).order_by('id')
     if pk is not None:
         products = products.filter(id=pk)
-    if products.exists():
-        for product in products:
-            product.product_variants = product.product_variants.filter(deleted__isnull=True)
-        if pk is not None:
-            return products.first()
-        return products
-    raise EntityNotFound()
+    data = products_data(products)
+    if not data:
+        raise EntityNotFound()
+    if pk is not None:
+        return data[0]
+    return data
+
+
+def retrieve_product_page(after=None, limit=PAGE_SIZE):
+    """Keyset page of products with their variants: {results, next}."""
+    rows, next_cursor = keysetPage(
+        Product.objects.filter(deleted__isnull=True).values(*PRODUCT_FIELDS), after, limit
+    )
+    return {'results': attach_variants(rows), 'next': next_cursor}
+
+
+def retrieve_variant_page(after=None, limit=PAGE_SIZE):
+    """Keyset page of variants: {results, next}."""
+    rows, next_cursor = keysetPage(
+        ProductVariant.objects.filter(deleted__isnull=True).values(*VARIANT_FIELDS), after, limit
+    )
+    return {'results': rows, 'next': next_cursor}
+
+
+def retrieve_catalogue(after=None, limit=PAGE_SIZE):
+    """Json encoded page of products with their variants and its etag, cached until the catalogue changes."""
+    return cached_catalogue(
+        'products:%s:%s' % (after, limit), lambda: dumps(retrieve_product_page(after, limit))
+    )
+
+
+def retrieve_variant_catalogue(after=None, limit=PAGE_SIZE):
+    """Json encoded page of variants and its etag, cached until the catalogue changes."""
+    return cached_catalogue(
+        'variants:%s:%s' % (after, limit), lambda: dumps(retrieve_variant_page(after, limit))
+    )
+
+
+def export_products():
+    """Iterates all the products with their variants, a page at a time."""
+    def fetch_page(after, limit):
+        page = retrieve_product_page(after, limit)
+        return page['results'], page['next']
+    return keysetIterator(fetch_page)
+
+
+def export_variants():
+    return ProductVariant.objects.filter(deleted__isnull=True).order_by('id').values(
+        *VARIANT_FIELDS
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
 
 
 def update_product(pk, data):
-    product = Product.objects.filter(pk=pk, deleted__isnull=True)
-    if not product.exists():
-        raise EntityNotFound()
-    if data.name is not None:
-        product.data = data.name
-    if data.base_price is not None:
-        product.base_price = data.base_price
-    if data.description is not None:
-        product.description = data.description
+    """
+    Updates only the given fields with a single conditional UPDATE ... RETURNING, which also reads the updated
+    product as a dict, no returned row means it was not found.
+    """
+    products = Product.objects.filter(pk=pk, deleted__isnull=True)
     try:
-        product.save()
+        if data:
+            rows = updateReturning(products, PRODUCT_FIELDS, data)
+        else:
+            rows = list(products.values(*PRODUCT_FIELDS)[:1])
     except IntegrityError:
         raise Conflict()
-    return product
+    if not rows:
+        raise EntityNotFound()
+    invalidate_catalogue()
+    return rows[0]
 
 
 def create_product(data):
     product = Product()
-    product.name = data.name
-    product.descrption = data.description
-    product.base_price = data.base_price
+    product.name = data['name']
+    product.description = data['description']
+    product.base_price = data['base_price']
     try:
         product.save()
     except IntegrityError:
         raise Conflict()
+    invalidate_catalogue()
     return product
 
 
 def delete_product(pk):
-    product = Product.objects.filter(id=pk, deleted__isnull=True)
-    product.deleted = datetime.now()
-    product.save()
+    """Soft deletes the product and its variants, one UPDATE each."""
+    now = timezone.now()
+    with transaction.atomic():
+        if not Product.objects.filter(id=pk, deleted__isnull=True).update(deleted=now):
+            raise EntityNotFound()
+        ProductVariant.objects.filter(product_id=pk, deleted__isnull=True).update(deleted=now)
+    invalidate_catalogue()
 
 
-def retrieve_variant(pk=None):
-    product_variant = ProductVariant.objects.filter(deleted__isnull=True)
-    if pk is not None:
-        product_variant = product_variant.filter(id=pk)
-    if product_variant.exists():
-        if pk is not None:
-            return product_variant.first()
-        return product_variant
-    raise EntityNotFound()
+def retrieve_variant(pk):
+    """Non deleted variant by pk as a dict, in a single query."""
+    variant = ProductVariant.objects.filter(id=pk, deleted__isnull=True).values(*VARIANT_FIELDS).first()
+    if variant is None:
+        raise EntityNotFound()
+    return variant
 
 
 def create_product_variant(pk, data):
     product_variant = ProductVariant()
-    product_variant.product_id = pk
-    product_variant.name = data.name
-    product_variant.description = data.description
-    product_variant.price = data.price
+    product_variant.product_id_id = pk
+    product_variant.name = data['name']
+    product_variant.description = data['description']
+    product_variant.price = data['price']
     try:
         product_variant.save()
     except IntegrityError:
         raise Conflict()
+    invalidate_catalogue()
     return product_variant
 
 
 def update_product_variant(pk, data):
-    product_variant = ProductVariant.objects.filter(pk=pk, deleted__isnull=True)
-    if not product_variant.exists():
-        raise EntityNotFound()
-    if data.name is not None:
-        product_variant.data = data.name
-    if data.price is not None:
-        product_variant.price = data.price
-    if data.description is not None:
-        product_variant.description = data.description
+    """Same as update_product for a variant."""
+    product_variants = ProductVariant.objects.filter(pk=pk, deleted__isnull=True)
     try:
-        product_variant.save()
+        if data:
+            rows = updateReturning(product_variants, VARIANT_FIELDS, data)
+        else:
+            rows = list(product_variants.values(*VARIANT_FIELDS)[:1])
     except IntegrityError:
         raise Conflict()
-    return product_variant
+    if not rows:
+        raise EntityNotFound()
+    invalidate_catalogue()
+    return rows[0]
 
 
 def delete_product_variant(pk):
-    product_variant = ProductVariant.objects.filter(id=pk, deleted__isnull=True)
-    product_variant.deleted = datetime.now()
-    product_variant.save()
+    if not ProductVariant.objects.filter(id=pk, deleted__isnull=True).update(deleted=timezone.now()):
+        raise EntityNotFound()
+    invalidate_catalogue()
+
+
+def _bulk_result(index, pk=None, error=None):
+    if error is not None:
+        return {'index': index, 'error': error}
+    return {'index': index, 'id': pk}
+
+
+def bulk_create_products(rows):
+    """
+    Creates the products validated by CreateProductSchema(many=True) in one transaction, using one query to
+    find name conflicts and batched inserts. Returns a result per row, with either its id or an error.
+    """
+    results = [None] * len(rows)
+    with transaction.atomic():
+        taken = set(Product.objects.filter(name__in=[row['name'] for row in rows]).values_list('name', flat=True))
+        products = []
+        indexes = []
+        for index, row in enumerate(rows):
+            if row['name'] in taken:
+                results[index] = _bulk_result(index, error=ExceptionCodes.conflict)
+                continue
+            taken.add(row['name'])
+            products.append(Product(name=row['name'], base_price=row['base_price'], description=row['description']))
+            indexes.append(index)
+
+        try:
+            products = Product.objects.bulk_create(products, batch_size=BULK_BATCH_SIZE)
+        except IntegrityError:
+            # Only a concurrent insert can get here
+            raise Conflict()
+
+        if products:
+            invalidate_catalogue()
+
+    for index, product in zip(indexes, products):
+        results[index] = _bulk_result(index, product.id)
+    return results
+
+
+def bulk_update_products(rows):
+    """
+    Updates the products validated by BulkUpdateProductSchema(many=True) in one transaction, with one query to
+    load them, one to find name conflicts and batched updates of only the given fields.
+    """
+    results = [None] * len(rows)
+    with transaction.atomic():
+        products = Product.objects.filter(deleted__isnull=True).in_bulk([row['id'] for row in rows])
+        names = [row['name'] for row in rows if 'name' in row]
+        taken = dict(Product.objects.filter(name__in=names).values_list('name', 'id'))
+
+        changed = {}
+        fields = set()
+        for index, row in enumerate(rows):
+            product = products.get(row['id'])
+            if product is None:
+                results[index] = _bulk_result(index, error=ExceptionCodes.notFound)
+                continue
+            if 'name' in row and taken.get(row['name'], product.id) != product.id:
+                results[index] = _bulk_result(index, error=ExceptionCodes.conflict)
+                continue
+            if 'name' in row:
+                taken.pop(product.name, None)
+                taken[row['name']] = product.id
+            for field in ('name', 'base_price', 'description'):
+                if field in row:
+                    setattr(product, field, row[field])
+                    fields.add(field)
+            changed[product.id] = product
+            results[index] = _bulk_result(index, product.id)
+
+        if changed and fields:
+            try:
+                Product.objects.bulk_update(list(changed.values()), list(fields), batch_size=BULK_BATCH_SIZE)
+            except IntegrityError:
+                raise Conflict()
+            invalidate_catalogue()
+
+    return results
+
+
+def bulk_delete_products(ids):
+    """Soft deletes the products with a single update. Returns a result per id."""
+    with transaction.atomic():
+        found = set(Product.objects.filter(id__in=ids, deleted__isnull=True).values_list('id', flat=True))
+        if found:
+            now = timezone.now()
+            Product.objects.filter(id__in=found).update(deleted=now)
+            ProductVariant.objects.filter(product_id__in=found, deleted__isnull=True).update(deleted=now)
+            invalidate_catalogue()
+    return [
+        _bulk_result(index, pk) if pk in found else _bulk_result(index, error=ExceptionCodes.notFound)
+        for index, pk in enumerate(ids)
+    ]
+
+
+def bulk_create_product_variants(rows):
+    """
+    Creates the variants validated by CreateProductVariantSchema(many=True) in one transaction.
+    Products and (product, name) conflicts are checked with a query each before the batched inserts.
+    """
+    results = [None] * len(rows)
+    with transaction.atomic():
+        product_ids = set(Product.objects.filter(
+            id__in={row['product_id'] for row in rows}, deleted__isnull=True
+        ).values_list('id', flat=True))
+        taken = set(ProductVariant.objects.filter(
+            product_id__in=product_ids, name__in={row['name'] for row in rows}
+        ).values_list('product_id', 'name'))
+
+        variants = []
+        indexes = []
+        for index, row in enumerate(rows):
+            if row['product_id'] not in product_ids:
+                results[index] = _bulk_result(index, error=ExceptionCodes.notFound)
+                continue
+            if (row['product_id'], row['name']) in taken:
+                results[index] = _bulk_result(index, error=ExceptionCodes.conflict)
+                continue
+            taken.add((row['product_id'], row['name']))
+            variants.append(ProductVariant(
+                product_id_id=row['product_id'], name=row['name'], price=row['price'], description=row['description']
+            ))
+            indexes.append(index)
+
+        try:
+            variants = ProductVariant.objects.bulk_create(variants, batch_size=BULK_BATCH_SIZE)
+        except IntegrityError:
+            raise Conflict()
+
+        if variants:
+            invalidate_catalogue()
+
+    for index, variant in zip(indexes, variants):
+        results[index] = _bulk_result(index, variant.id)
+    return results
+
+
+def bulk_update_product_variants(rows):
+    """Same as bulk_update_products for the variants validated by BulkUpdateProductVariantSchema(many=True)."""
+    results = [None] * len(rows)
+    with transaction.atomic():
+        variants = ProductVariant.objects.filter(deleted__isnull=True).in_bulk([row['id'] for row in rows])
+        taken = dict(((product_id, name), pk) for pk, product_id, name in ProductVariant.objects.filter(
+            product_id__in={variant.product_id_id for variant in variants.values()},
+            name__in=[row['name'] for row in rows if 'name' in row]
+        ).values_list('id', 'product_id', 'name'))
+
+        changed = {}
+        fields = set()
+        for index, row in enumerate(rows):
+            variant = variants.get(row['id'])
+            if variant is None:
+                results[index] = _bulk_result(index, error=ExceptionCodes.notFound)
+                continue
+            if 'name' in row:
+                key = (variant.product_id_id, row['name'])
+                if taken.get(key, variant.id) != variant.id:
+                    results[index] = _bulk_result(index, error=ExceptionCodes.conflict)
+                    continue
+                taken.pop((variant.product_id_id, variant.name), None)
+                taken[key] = variant.id
+            for field in ('name', 'price', 'description'):
+                if field in row:
+                    setattr(variant, field, row[field])
+                    fields.add(field)
+            changed[variant.id] = variant
+            results[index] = _bulk_result(index, variant.id)
+
+        if changed and fields:
+            try:
+                ProductVariant.objects.bulk_update(list(changed.values()), list(fields), batch_size=BULK_BATCH_SIZE)
+            except IntegrityError:
+                raise Conflict()
+            invalidate_catalogue()
+
+    return results
+
+
+def bulk_delete_product_variants(ids):
+    """Soft deletes the variants with a single update. Returns a result per id."""
+    with transaction.atomic():
+        found = set(ProductVariant.objects.filter(id__in=ids, deleted__isnull=True).values_list('id', flat=True))
+        if found:
+            ProductVariant.objects.filter(id__in=found).update(deleted=timezone.now())
+            invalidate_catalogue()
+    return [
+        _bulk_result(index, pk) if pk in found else _bulk_result(index, error=ExceptionCodes.notFound)
+        for index, pk in enumerate(ids)
+    ]
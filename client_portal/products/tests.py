@@ -0,0 +1,145 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from client_portal.common.pagination import EXPORT_CHUNK_SIZE, MAX_PAGE_SIZE
+from client_portal.products import services as product_services
+from client_portal.products.models import Product, ProductVariant
+from middleware.exceptions import EntityNotFound
+
+CATALOGUE_SIZES = (10, 100, 1000, 10000)
+
+
+def create_products(start, stop, variants=2):
+    products = Product.objects.bulk_create([
+        Product(name='product-%s' % i, base_price=Decimal('10.00'), description='description')
+        for i in range(start, stop)
+    ], batch_size=1000)
+    ProductVariant.objects.bulk_create([
+        ProductVariant(product_id=product, name='variant-%s' % v, price=Decimal('12.50'), description='variant')
+        for product in products for v in range(variants)
+    ], batch_size=1000)
+    return products
+
+
+class CatalogueQueryCountTests(TestCase):
+    """The catalogue read paths take a constant number of queries as the catalogue grows."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_catalogue_queries_are_constant(self):
+        created = 0
+        for size in CATALOGUE_SIZES:
+            create_products(created, size)
+            created = size
+
+            with self.subTest(products=size):
+                # Products and then the variants of all of them
+                with self.assertNumQueries(2):
+                    products = product_services.retrieve_product_data()
+                self.assertEqual(len(products), size)
+                self.assertEqual(len(products[-1]['variants']), 2)
+
+                with self.assertNumQueries(2):
+                    page = product_services.retrieve_product_page(limit=MAX_PAGE_SIZE)
+                self.assertEqual(len(page['results']), min(size, MAX_PAGE_SIZE))
+
+                with self.assertNumQueries(2):
+                    product_services.retrieve_product_data(products[-1]['id'])
+
+                with self.assertNumQueries(1):
+                    product_services.retrieve_variant_page(limit=MAX_PAGE_SIZE)
+
+    def test_export_queries_grow_per_chunk(self):
+        size = CATALOGUE_SIZES[-1]
+        create_products(0, size)
+        pages = -(-size // EXPORT_CHUNK_SIZE)
+
+        with self.assertNumQueries(2 * pages):
+            rows = sum(1 for _ in product_services.export_products())
+        self.assertEqual(rows, size)
+
+    def test_cached_catalogue_skips_the_database(self):
+        create_products(0, 100)
+        client = APIClient()
+
+        with self.assertNumQueries(2):
+            response = client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(0):
+            cached = client.get('/api/products/')
+        self.assertEqual(cached.content, response.content)
+
+        with self.assertNumQueries(0):
+            not_modified = client.get('/api/products/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_missing_product(self):
+        # No variants query without products
+        with self.assertNumQueries(1):
+            with self.assertRaises(EntityNotFound):
+                product_services.retrieve_product_data(1)
+
+
+class ProductMutationQueryCountTests(TestCase):
+    """Mutations are single conditional statements, not found is told by the row count."""
+
+    def setUp(self):
+        self.product = create_products(0, 1)[0]
+        self.variant = self.product.variants.first()
+
+    def test_update_product(self):
+        # UPDATE ... RETURNING the updated row
+        with self.assertNumQueries(1):
+            product = product_services.update_product(self.product.id, {'description': 'changed'})
+        self.assertEqual(product, {
+            'id': self.product.id, 'name': 'product-0', 'base_price': Decimal('10.00'), 'description': 'changed'
+        })
+
+        with self.assertNumQueries(1):
+            with self.assertRaises(EntityNotFound):
+                product_services.update_product(self.product.id + 1, {'description': 'changed'})
+
+    def test_delete_product_cascades_to_variants(self):
+        # Savepoint, UPDATE of the product, UPDATE of its variants, release
+        with self.assertNumQueries(4):
+            product_services.delete_product(self.product.id)
+        self.assertFalse(ProductVariant.objects.filter(product_id=self.product, deleted__isnull=True).exists())
+
+        # The savepoint is rolled back after the UPDATE matched no row
+        with self.assertNumQueries(4):
+            with self.assertRaises(EntityNotFound):
+                product_services.delete_product(self.product.id)
+
+    def test_update_variant(self):
+        with self.assertNumQueries(1):
+            variant = product_services.update_product_variant(self.variant.id, {'price': Decimal('1.00')})
+        self.assertEqual(variant['price'], Decimal('1.00'))
+        self.assertEqual(variant['product_id'], self.product.id)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(product_services.retrieve_variant(self.variant.id), variant)
+
+        product_services.delete_product_variant(self.variant.id)
+        with self.assertNumQueries(1):
+            with self.assertRaises(EntityNotFound):
+                product_services.retrieve_variant(self.variant.id)
+
+    def test_delete_variant(self):
+        with self.assertNumQueries(1):
+            product_services.delete_product_variant(self.variant.id)
+
+        with self.assertNumQueries(1):
+            with self.assertRaises(EntityNotFound):
+                product_services.delete_product_variant(self.variant.id)
+
+    def test_bulk_delete_products(self):
+        products = create_products(1, 101)
+        # Savepoint, live ids, UPDATE of the products, UPDATE of their variants, release
+        with self.assertNumQueries(5):
+            results = product_services.bulk_delete_products([product.id for product in products])
+        self.assertTrue(all('id' in result for result in results))
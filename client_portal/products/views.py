@@ -1,24 +1,34 @@
-from marshmallow import EXCLUDE
+from marshmallow import EXCLUDE, ValidationError
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.core import serializers
+from rest_framework.permissions import IsAuthenticatedOrReadOnly
 
-from middleware import authorizers
 from middleware.exceptions import HttpError
+from middleware.idempotency import idempotent
+from client_portal.common.renderers import jsonResponse
+from client_portal.common.pagination import pageParams, isExport, ndjsonResponse
 from client_portal.products import services as product_services
+from client_portal.products.cache import etag_matches
 from client_portal.products.schemas import (
     UpdateProductSchema,
     CreateProductSchema,
     CreateProductVariantSchema,
-    UpdateProductVariantSchema
+    UpdateProductVariantSchema,
+    BulkUpdateProductSchema,
+    BulkUpdateProductVariantSchema,
+    BulkDeleteSchema
 )
 
 
 class Product(viewsets.ViewSet):
+    # The catalogue is public, changing it requires a user
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
     def retrieve(self, request, pk, **kwargs):
         try:
-            product = product_services.retrieve_product(pk)
-            return Response(serializers.serialize('json', product), status=status.HTTP_200_OK)
+            product = product_services.retrieve_product_data(pk)
+            return jsonResponse(product, status=status.HTTP_200_OK)
         except HttpError as e:
             return Response(status=e.status_code)
         except Exception as e:
@@ -27,41 +37,42 @@ class Product(viewsets.ViewSet):
 
     def get(self, request, **kwargs):
         try:
-            product = product_services.retrieve_product()
-            if product is None:
-                return Response(status=status.HTTP_404_NOT_FOUND)
-            return Response(serializers.serialize('json', product), status=status.HTTP_200_OK)
+            if isExport(request):
+                return ndjsonResponse(request, product_services.export_products())
+            after, limit = pageParams(request)
+            payload, etag = product_services.retrieve_catalogue(after, limit)
+            if etag_matches(request, etag):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+            return jsonResponse(payload, status=status.HTTP_200_OK, headers={'ETag': etag})
         except HttpError as e:
             return Response(status=e.status_code)
         except Exception as e:
             print(e)
             return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @authorizers.authorized
     def update(self, request, pk, **kwargs):
         try:
             data = UpdateProductSchema().load(request.data, unknown=EXCLUDE)
             product = product_services.update_product(pk, data)
-            return Response(serializers.serialize('json', product), status=status.HTTP_200_OK)
+            return jsonResponse(product, status=status.HTTP_200_OK)
         except HttpError as e:
             return Response(status=e.status_code)
         except Exception as e:
             print(e)
             return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @authorizers.authorized
+    @idempotent
     def create(self, request, **kwargs):
         try:
             data = CreateProductSchema().load(request.data, unknown=EXCLUDE)
             product = product_services.create_product(data)
-            return Response(serializers.serialize('json', product), status=status.HTTP_201_CREATED)
+            return jsonResponse(product_services.product_to_dict(product), status=status.HTTP_201_CREATED)
         except HttpError as e:
             return Response(status=e.status_code)
         except Exception as e:
             print(e)
             return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @authorizers.authorized
     def delete(self, request, pk, **kwargs):
         try:
             product_services.delete_product(pk)
@@ -75,7 +86,7 @@ class Product(viewsets.ViewSet):
     def retrieve_variant(self, request, pk, **kwargs):
         try:
             product_variant = product_services.retrieve_variant(pk)
-            return Response(serializers.serialize('json', product_variant), status=status.HTTP_200_OK)
+            return jsonResponse(product_variant, status=status.HTTP_200_OK)
         except HttpError as e:
             return Response(status=e.status_code)
         except Exception as e:
@@ -84,39 +95,42 @@ class Product(viewsets.ViewSet):
 
     def get_variant(self, request, **kwargs):
         try:
-            product_variants = product_services.retrieve_variant()
-            return Response(serializers.serialize('json', product_variants), status=status.HTTP_200_OK)
+            if isExport(request):
+                return ndjsonResponse(request, product_services.export_variants())
+            after, limit = pageParams(request)
+            payload, etag = product_services.retrieve_variant_catalogue(after, limit)
+            if etag_matches(request, etag):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+            return jsonResponse(payload, status=status.HTTP_200_OK, headers={'ETag': etag})
         except HttpError as e:
             return Response(status=e.status_code)
         except Exception as e:
             print(e)
             return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @authorizers.authorized
+    @idempotent
     def create_variant(self, request, pk, **kwargs):
         try:
             data = CreateProductVariantSchema().load(request.data, unknown=EXCLUDE)
             product_variant = product_services.create_product_variant(pk, data)
-            return Response(serializers.serialize('json', product_variant), status=status.HTTP_200_OK)
+            return jsonResponse(product_services.variant_to_dict(product_variant), status=status.HTTP_200_OK)
         except HttpError as e:
             return Response(status=e.status_code)
         except Exception as e:
             print(e)
             return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @authorizers.authorized
     def update_variant(self, request, pk, **kwargs):
         try:
             data = UpdateProductVariantSchema().load(request.data, unknown=EXCLUDE)
             product_variant = product_services.update_product_variant(pk, data)
-            return Response(serializers.serialize('json', product_variant), status=status.HTTP_200_OK)
+            return jsonResponse(product_variant, status=status.HTTP_200_OK)
         except HttpError as e:
             return Response(status=e.status_code)
         except Exception as e:
             print(e)
             return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @authorizers.authorized
     def delete_variant(self, request, pk, **kwargs):
         try:
             product_services.delete_product_variant(pk)
@@ -126,3 +140,47 @@ class Product(viewsets.ViewSet):
         except Exception as e:
             print(e)
             return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def _bulk(self, request, schema, operation):
+        try:
+            data = schema.load(request.data, unknown=EXCLUDE)
+            if isinstance(schema, BulkDeleteSchema):
+                data = data['ids']
+            return jsonResponse({'results': operation(data)}, status=status.HTTP_200_OK)
+        except ValidationError as e:
+            return Response(e.messages, status=status.HTTP_400_BAD_REQUEST)
+        except HttpError as e:
+            return Response(status=e.status_code)
+        except Exception as e:
+            print(e)
+            return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    @idempotent
+    def bulk_create(self, request, **kwargs):
+        return self._bulk(request, CreateProductSchema(many=True), product_services.bulk_create_products)
+
+    @bulk_create.mapping.patch
+    def bulk_update(self, request, **kwargs):
+        return self._bulk(request, BulkUpdateProductSchema(many=True), product_services.bulk_update_products)
+
+    @action(detail=False, methods=['post'], url_path='bulk-delete')
+    def bulk_delete(self, request, **kwargs):
+        return self._bulk(request, BulkDeleteSchema(), product_services.bulk_delete_products)
+
+    @action(detail=False, methods=['post'], url_path='variants/bulk')
+    @idempotent
+    def bulk_create_variants(self, request, **kwargs):
+        return self._bulk(
+            request, CreateProductVariantSchema(many=True), product_services.bulk_create_product_variants
+        )
+
+    @bulk_create_variants.mapping.patch
+    def bulk_update_variants(self, request, **kwargs):
+        return self._bulk(
+            request, BulkUpdateProductVariantSchema(many=True), product_services.bulk_update_product_variants
+        )
+
+    @action(detail=False, methods=['post'], url_path='variants/bulk-delete')
+    def bulk_delete_variants(self, request, **kwargs):
+        return self._bulk(request, BulkDeleteSchema(), product_services.bulk_delete_product_variants)
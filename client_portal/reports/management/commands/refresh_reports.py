@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from client_portal.reports import services as report_services
+
+
+class Command(BaseCommand):
+    help = 'Adds the orders placed since the last refresh to the report rollups.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=report_services.REPORT_ROLLUP_BATCH,
+                            help='Orders rolled up per transaction.')
+
+    def handle(self, *args, **options):
+        refreshed = report_services.refresh_rollups(options['batch'])
+        self.stdout.write(self.style.SUCCESS('Rolled up %s orders.' % refreshed))
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:55
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def create_state(apps, schema_editor):
+    # Orders placed before order lines existed are skipped by 0002_skip_legacy_orders
+    apps.get_model('reports', 'RollupState').objects.create(name='orders', last_order_id=0)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('name', models.CharField(max_length=63, primary_key=True, serialize=False)),
+                ('last_order_id', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyProductRevenue',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('product_id', models.IntegerField()),
+                ('currency', models.CharField(max_length=3)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'product_id', 'currency'), name='daily_product_revenue_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('currency', models.CharField(max_length=3)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('items', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'currency'), name='daily_revenue_key')],
+            },
+        ),
+        migrations.RunPython(create_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def skip_legacy_orders(apps, schema_editor):
+    # Orders placed before orders.0004 have no lines and their created was backfilled with the migration time,
+    # so rolling them up would put all the historical revenue on that day. The high-water mark starts after
+    # them instead, and any rollup already built from them is dropped to be rebuilt by the next refresh.
+    Order = apps.get_model('orders', 'Order')
+    legacy = Order.objects.filter(lines__isnull=True).order_by('-id').values_list('id', flat=True).first()
+    if legacy is None:
+        return
+
+    apps.get_model('reports', 'DailyRevenue').objects.all().delete()
+    apps.get_model('reports', 'DailyProductRevenue').objects.all().delete()
+    apps.get_model('reports', 'RollupState').objects.update_or_create(
+        name='orders', defaults={'last_order_id': legacy}
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_initial'),
+        ('orders', '0004_order_created_orderline'),
+    ]
+
+    operations = [
+        migrations.RunPython(skip_legacy_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+from decimal import Decimal
+from django.db import models
+
+ORDERS_ROLLUP = 'orders'
+
+
+class RollupState(models.Model):
+    name = models.CharField(max_length=63, primary_key=True)
+    # High-water mark: orders up to this id are already in the rollups
+    last_order_id = models.IntegerField(default=0)
+
+
+class DailyRevenue(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    day = models.DateField()
+    currency = models.CharField(max_length=3)
+    orders = models.PositiveIntegerField(default=0)
+    items = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(decimal_places=2, max_digits=14, default=Decimal('0'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'currency'], name='daily_revenue_key'),
+        ]
+
+
+class DailyProductRevenue(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    day = models.DateField()
+    # Not a foreign key, reports never join the catalogue
+    product_id = models.IntegerField()
+    currency = models.CharField(max_length=3)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(decimal_places=2, max_digits=14, default=Decimal('0'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product_id', 'currency'], name='daily_product_revenue_key'),
+        ]
@@ -0,0 +1,132 @@
+from datetime import date, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum, Window
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from client_portal.jobs import queue
+from client_portal.orders.models import Order, OrderLine
+from client_portal.reports.models import ORDERS_ROLLUP, RollupState, DailyRevenue, DailyProductRevenue
+from middleware.exceptions import BadRequest
+
+REPORT_ROLLUP_LAG = settings.REPORT_ROLLUP_LAG
+REPORT_ROLLUP_BATCH = settings.REPORT_ROLLUP_BATCH
+REPORT_MAX_DAYS = settings.REPORT_MAX_DAYS
+
+REFRESH_ROLLUPS_TASK = 'reports.refresh_rollups'
+
+
+def _accumulate(model, rows, key_fields, sum_fields):
+    """Adds the aggregated rows to the rollup rows with the same key, inserting the missing ones."""
+    current = {
+        tuple(getattr(rollup, field) for field in key_fields): rollup
+        for rollup in model.objects.filter(day__in={row['day'] for row in rows})
+    }
+    created, updated = [], []
+    for row in rows:
+        rollup = current.get(tuple(row[field] for field in key_fields))
+        if rollup is None:
+            created.append(model(**{field: row[field] for field in key_fields + sum_fields}))
+        else:
+            for field in sum_fields:
+                setattr(rollup, field, getattr(rollup, field) + row[field])
+            updated.append(rollup)
+
+    model.objects.bulk_update(updated, sum_fields, batch_size=500)
+    model.objects.bulk_create(created, batch_size=500)
+
+
+def _rollup(after, until):
+    # Aggregates are grouped in the database, only one row per day, currency (and product) reaches python
+    daily = Order.objects.filter(id__gt=after, id__lte=until).annotate(day=TruncDate('created')).values(
+        'day', 'currency'
+    ).annotate(orders=Count('id'), items=Sum('item_count'), revenue=Sum('price')).order_by()
+    _accumulate(DailyRevenue, list(daily), ['day', 'currency'], ['orders', 'items', 'revenue'])
+
+    products = OrderLine.objects.filter(order_id__gt=after, order_id__lte=until).values(
+        'product_id', day=TruncDate('order_id__created'), currency=F('order_id__currency')
+    ).annotate(orders=Count('order_id', distinct=True), units=Sum('quantity'), revenue=Sum('amount')).order_by()
+    _accumulate(DailyProductRevenue, list(products), ['day', 'product_id', 'currency'], ['orders', 'units', 'revenue'])
+
+
+def refresh_rollups(batch=REPORT_ROLLUP_BATCH):
+    """
+    Adds the orders placed since the last refresh to the daily rollups, batch orders per transaction, and
+    returns how many were added. Only orders older than REPORT_ROLLUP_LAG are taken, so a transaction that
+    got a lower id but commits later than another isn't skipped by the high-water mark.
+    Refreshes are serialized by the lock on the rollup state, which is created again if missing (e.g. after a
+    flush).
+    """
+    refreshed = 0
+    while True:
+        with transaction.atomic():
+            state, _ = RollupState.objects.select_for_update().get_or_create(name=ORDERS_ROLLUP)
+            settled = timezone.now() - timedelta(seconds=REPORT_ROLLUP_LAG)
+            ids = list(Order.objects.filter(id__gt=state.last_order_id, created__lt=settled).order_by('id').values_list(
+                'id', flat=True
+            )[:batch])
+            if ids:
+                _rollup(state.last_order_id, ids[-1])
+                state.last_order_id = ids[-1]
+                state.save(update_fields=['last_order_id'])
+
+        refreshed += len(ids)
+        if len(ids) < batch:
+            return refreshed
+
+
+def schedule_refresh():
+    """
+    Queues a rollup refresh for the orders placed this minute, to run once they are all settled.
+    Every order of the same minute shares the job key, so it is queued once.
+    """
+    now = timezone.now()
+    minute = now.replace(second=0, microsecond=0)
+    run_at = minute + timedelta(seconds=60 + REPORT_ROLLUP_LAG)
+    queue.enqueue(REFRESH_ROLLUPS_TASK, key='%s:%s' % (REFRESH_ROLLUPS_TASK, minute.isoformat()),
+                  delay=(run_at - now).total_seconds())
+
+
+def report_params(request):
+    """
+    Reads the report range and currency from the query string:
+        from, to: iso dates, the last 30 days by default, up to REPORT_MAX_DAYS apart
+        currency: UYU or USD, every currency if missing
+    Raises BadRequest if they are not valid.
+    """
+    try:
+        end = date.fromisoformat(request.GET['to']) if request.GET.get('to') else timezone.now().date()
+        start = date.fromisoformat(request.GET['from']) if request.GET.get('from') else end - timedelta(days=29)
+    except ValueError:
+        raise BadRequest()
+
+    currency = request.GET.get('currency') or None
+    if start > end or (end - start).days >= REPORT_MAX_DAYS or currency not in (None, 'UYU', 'USD'):
+        raise BadRequest()
+
+    return start, end, currency
+
+
+def revenue_report(start, end, currency=None):
+    """
+    Revenue per day, currency and product between start and end, both included, read only from the rollups,
+    so its cost depends on the range and not on the number of orders.
+    """
+    daily = DailyRevenue.objects.filter(day__gte=start, day__lte=end)
+    products = DailyProductRevenue.objects.filter(day__gte=start, day__lte=end)
+    if currency is not None:
+        daily = daily.filter(currency=currency)
+        products = products.filter(currency=currency)
+
+    return {
+        'daily': list(daily.annotate(
+            cumulative_revenue=Window(Sum('revenue'), partition_by=[F('currency')], order_by=F('day').asc())
+        ).order_by('currency', 'day').values('day', 'currency', 'orders', 'items', 'revenue', 'cumulative_revenue')),
+        'currencies': list(daily.values('currency').annotate(
+            orders=Sum('orders'), items=Sum('items'), revenue=Sum('revenue')
+        ).order_by('currency')),
+        'products': list(products.values('product_id', 'currency').annotate(
+            orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue')
+        ).order_by('currency', '-revenue', 'product_id')),
+    }
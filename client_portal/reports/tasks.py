@@ -0,0 +1,7 @@
+from client_portal.jobs.queue import task
+from client_portal.reports import services as report_services
+
+
+@task(report_services.REFRESH_ROLLUPS_TASK)
+def refresh_rollups():
+    report_services.refresh_rollups()
@@ -0,0 +1,39 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from client_portal.orders import services as order_services
+from client_portal.orders.models import Order
+from client_portal.products.models import Product
+from client_portal.reports import services as report_services
+from client_portal.reports.models import RollupState, DailyRevenue
+from client_portal.users.models import User
+
+
+class RefreshRollupsTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='client', password='-', name='Client')
+        self.product = Product.objects.create(name='product', base_price=Decimal('10.00'), description='product')
+
+    def place_order(self):
+        order, _ = order_services.create_order(self.user, {
+            'address_street': 'street', 'address_number': '1', 'items': [{'product_id': self.product.id, 'quantity': 1}]
+        })
+        # Settled orders only
+        Order.objects.filter(id=order.id).update(created=timezone.now() - timedelta(days=1))
+        return order
+
+    def test_missing_state_is_recreated(self):
+        RollupState.objects.all().delete()
+        self.place_order()
+
+        self.assertEqual(report_services.refresh_rollups(), 1)
+        self.assertEqual(RollupState.objects.get().last_order_id, Order.objects.get().id)
+        self.assertEqual(DailyRevenue.objects.get().revenue, Decimal('10.00'))
+
+        self.place_order()
+        self.assertEqual(report_services.refresh_rollups(), 1)
+        self.assertEqual(DailyRevenue.objects.get().orders, 2)
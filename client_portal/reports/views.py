@@ -0,0 +1,27 @@
+import logging
+
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from middleware import authorizers
+from middleware.exceptions import HttpError
+from client_portal.common.renderers import jsonResponse
+from client_portal.reports import services as report_services
+
+logger = logging.getLogger(__name__)
+
+
+class Report(viewsets.ViewSet):
+    permission_classes = [authorizers.IsAdmin]
+
+    @action(detail=False, methods=['get'])
+    def revenue(self, request, **kwargs):
+        try:
+            start, end, currency = report_services.report_params(request)
+            return jsonResponse(report_services.revenue_report(start, end, currency), status=status.HTTP_200_OK)
+        except HttpError as e:
+            return Response(status=e.status_code)
+        except Exception:
+            logger.exception('Unhandled error in %s', request.path)
+            return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -37,8 +37,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'client_portal.common',
     'client_portal.products',
-    'client_portal.users'
+    'client_portal.users',
+    'client_portal.jobs',
+    'client_portal.orders',
+    'client_portal.reports',
+    'client_portal.idempotency'
 ]
 
 MIDDLEWARE = [
@@ -89,6 +94,72 @@ DATABASES = {
 }
 
 
+# Rest framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': ['middleware.authorizers.TokenAuthentication'],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Local memory by default, set CACHE_BACKEND/CACHE_LOCATION to share it between workers (e.g. redis).
+# With local memory every worker keeps its own catalogue, cached for a few seconds only, see products.cache
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+
+# Pagination
+# List endpoints use keyset pagination on id, see client_portal.common.pagination
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000  # Rows fetched per query by the ndjson exports
+
+
+# Orders
+# Catalogue prices have no currency, so every order is charged in CATALOGUE_CURRENCY, see client_portal.orders.services
+
+CATALOGUE_CURRENCY = os.getenv('CATALOGUE_CURRENCY', 'USD')  # One of the Order currency choices
+MAX_ITEM_QUANTITY = 1000  # Units of a single cart item
+
+
+# Jobs
+# Background jobs are queued in the database and run by the run_jobs command, see client_portal.jobs.queue
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))  # Worker processes
+JOB_BATCH_SIZE = 10  # Jobs claimed per query
+JOB_POLL_INTERVAL = 1  # seconds between polls when the queue is empty
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 5  # seconds before the first retry, doubled on each attempt
+JOB_MAX_RETRY_DELAY = 60 * 60
+JOB_LOCK_TIMEOUT = 60 * 10  # seconds before the job of a dead worker is run again
+JOB_RETENTION = 60 * 60 * 24 * 7  # seconds done and failed jobs are kept
+JOB_PURGE_INTERVAL = 60 * 60  # seconds between purges of finished jobs on each worker
+
+
+# Reports
+# Revenue reports read daily rollups refreshed incrementally from the orders, see client_portal.reports.services
+
+REPORT_ROLLUP_LAG = 60  # seconds given to an order to commit before it's rolled up
+REPORT_ROLLUP_BATCH = 10000  # Orders rolled up per transaction
+REPORT_MAX_DAYS = 366  # Longest report range
+
+
+# Idempotency
+# Create endpoints replay the stored response of requests retried with the same Idempotency-Key header,
+# see middleware.idempotency
+
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24  # seconds a response is kept
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
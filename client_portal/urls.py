@@ -17,10 +17,16 @@ Including another URLconf
 from django.urls import include, re_path, path
 from django.contrib import admin
 from client_portal.users.views import User
+from client_portal.products.views import Product
+from client_portal.orders.views import Order
+from client_portal.reports.views import Report
 
 from rest_framework import routers
 router = routers.DefaultRouter()
 router.register(r'users', User, basename='users')
+router.register(r'products', Product, basename='products')
+router.register(r'orders', Order, basename='orders')
+router.register(r'reports', Report, basename='reports')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
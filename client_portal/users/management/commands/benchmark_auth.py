@@ -0,0 +1,61 @@
+import time
+
+import jwt
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from client_portal.common.benchmarks import rolledBack, bestTime, countQueries
+from client_portal.users import constants
+from client_portal.users.models import User, UserPermission
+from client_portal.users.tokens import verified_tokens
+from middleware import authorizers
+
+SECRET = 'benchmark-secret-long-enough-for-hs256-keys'
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks authenticating an admin request the way the authorizer decorators did, against '
+        'TokenAuthentication with warm token and principal caches. Seeded users are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help='Requests authenticated per run.')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs of every case, the best one is shown.')
+
+    def run(self, label, count, func, repeat):
+        seconds = bestTime(lambda: [func() for _ in range(count)], repeat)
+        queries = countQueries(func)
+        self.stdout.write('%-24s %10.1f us/request %8.0f requests/s %3d queries/request' % (
+            label, seconds / count * 1000000, count / seconds, queries
+        ))
+
+    def handle(self, *args, **options):
+        with override_settings(SECRET=SECRET), rolledBack():
+            user = User.objects.create(username='benchmark-admin', password='-', name='benchmark')
+            user.permissions.add(UserPermission.objects.create(name=constants.ADMIN, enabled=True))
+
+            token = jwt.encode({'sub': str(user.id), 'exp': int(time.time()) + 3600}, SECRET, algorithm='HS256')
+            httpRequest = APIRequestFactory().get('/', HTTP_AUTHORIZATION='Bearer ' + token)
+
+            # The admin decorator: verify the token, load the user, then scan its permissions
+            def decorated():
+                request = Request(httpRequest)
+                raw = authorizers.get_token_from_raw_authorization(request.headers.get('Authorization', None))
+                payload = jwt.decode(raw, SECRET, algorithms='HS256')
+                found = User.objects.get(id=int(payload['sub']))
+                return any(p.enabled and p.name == constants.ADMIN for p in found.permissions.iterator())
+
+            def authenticated():
+                request = Request(httpRequest, authenticators=[authorizers.TokenAuthentication()])
+                return authorizers.is_admin(request)
+
+            verified_tokens.clear()
+            authorizers.principals.invalidate()
+            if not authenticated():
+                raise CommandError('The benchmark user was not authenticated as an admin.')
+
+            self.run('decorators', options['requests'], decorated, options['repeat'])
+            self.run('TokenAuthentication', options['requests'], authenticated, options['repeat'])
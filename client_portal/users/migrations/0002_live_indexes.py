@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('deleted__isnull', True)), fields=['id'], name='user_live_idx'),
+        ),
+    ]
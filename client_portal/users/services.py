@@ -1,40 +1,65 @@
 from django.conf import settings
 from django.contrib.auth.hashers import make_password
+from django.utils import timezone
 
 from client_portal.users.models import User
 from middleware.exceptions import EntityNotFound
+from middleware.authorizers import principals
+from client_portal.common.pagination import keysetPage, PAGE_SIZE, EXPORT_CHUNK_SIZE
+
+# Fields exposed by the API, never the password
+USER_FIELDS = ('id', 'username', 'name', 'created', 'updated')
+
+
+def user_to_dict(user):
+    return {field: getattr(user, field) for field in USER_FIELDS}
+
+
+def retrieve_users_page(after=None, limit=PAGE_SIZE):
+    rows, next_cursor = keysetPage(User.objects.filter(deleted__isnull=True).values(*USER_FIELDS), after, limit)
+    return {'results': rows, 'next': next_cursor}
+
+
+def export_users():
+    return User.objects.filter(deleted__isnull=True).order_by('id').values(
+        *USER_FIELDS
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
 
 
 def create_user(data):
     user = User()
-    user.username = data.username
-    user.password = make_password(data.password, hasher=settings.SECRET)
-    user.name = data.name
+    user.username = data['username']
+    user.password = make_password(data['password'], hasher=settings.SECRET)
+    user.name = data['name']
     user.save()
     return user
 
 
 def retrieve_users(pk=None):
     if pk is not None:
-        user = User.objects.get(id=pk)
-        return user
+        # None if the user doesn't exist or was deleted
+        return User.objects.filter(id=pk, deleted__isnull=True).first()
     users = User.objects.filter(deleted__isnull=True)
     return users
 
 
 def update_user(user, data):
-    if data.username is not None:
-        user.username = data.username
-    if data.password is not None:
-        user.password = make_password(data.password, hasher=settings.SECRET)
-    if data.name is not None:
-        user.name = data.name
-    user.save()
+    """Writes only the given fields with a single UPDATE and applies them to user."""
+    fields = dict(data)
+    if 'password' in fields:
+        fields['password'] = make_password(fields['password'], hasher=settings.SECRET)
+    fields['updated'] = timezone.now()
+    if not User.objects.filter(pk=user.id, deleted__isnull=True).update(**fields):
+        raise EntityNotFound()
+    # update() doesn't send signals
+    principals.invalidate(user.id)
+    for field, value in fields.items():
+        setattr(user, field, value)
     return user
 
 
 def delete_user(pk):
-    user = User.objects.get(id=pk)
-    if user is None:
+    if not User.objects.filter(id=pk, deleted__isnull=True).update(deleted=timezone.now()):
         raise EntityNotFound()
-    user.delete()
+    # update() doesn't send signals
+    principals.invalidate(int(pk))
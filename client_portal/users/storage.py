@@ -26,15 +26,8 @@ class UserStorage(storage.BaseS3Storage):
     urlExpiration = 60 * 60 * 6  # 6 hours
 
     def friendlyUrl(self, name, fName, ext):
-        return self._generateSignedUrl(Params={
-            "Bucket": self.s3Bucket,
-            "Key": name,
-            'ResponseContentDisposition': 'attachment; filename=%s.%s' % (fName, ext)
-            # Boto3 already escapes name
-        },
-
-            ExpiresIn=self.urlExpiration
-        )
+        return self.getPrivateUrl(name, self.urlExpiration, 'attachment; filename=%s.%s' % (fName, ext))
 
 
-userStorage = UserStorage()
\ No newline at end of file
+userStorage = UserStorage()
+asyncUserStorage = storage.AsyncS3Storage(userStorage)
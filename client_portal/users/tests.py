@@ -0,0 +1,114 @@
+import time
+
+import jwt
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from client_portal.users import constants
+from client_portal.users import services as user_services
+from client_portal.users.models import User, UserPermission
+from client_portal.users.tokens import verified_tokens
+from middleware.authorizers import principals
+from middleware.exceptions import EntityNotFound
+
+SECRET = 'test-secret-long-enough-for-hs256-keys'
+
+
+def token_for(user):
+    return jwt.encode({'sub': str(user.id), 'exp': int(time.time()) + 60}, SECRET, algorithm='HS256')
+
+
+@override_settings(SECRET=SECRET)
+class PrincipalCacheTests(TestCase):
+    """Authenticating a warm request is answered from the principals and verified tokens caches."""
+
+    def setUp(self):
+        principals.invalidate()
+        verified_tokens.clear()
+        self.user = User.objects.create(username='user', password='-', name='User')
+        self.admin = User.objects.create(username='admin', password='-', name='Admin')
+        self.admin.permissions.add(UserPermission.objects.create(name=constants.ADMIN, enabled=True))
+        principals.invalidate()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + token_for(user))
+        return client
+
+    def test_warm_request_has_no_queries(self):
+        client = self.client_for(self.user)
+
+        # The user and its permissions
+        with self.assertNumQueries(2):
+            response = client.get('/api/users/%s/' % self.user.id)
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = client.get('/api/users/%s/' % self.user.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['username'], 'user')
+
+    def test_warm_admin_check_has_no_queries(self):
+        client = self.client_for(self.admin)
+        client.get('/api/users/%s/' % self.admin.id)
+
+        # Only the requested user is read, the admin check uses the cached permission names
+        with self.assertNumQueries(1):
+            response = client.get('/api/users/%s/' % self.user.id)
+        self.assertEqual(response.status_code, 200)
+
+        client = self.client_for(self.user)
+        client.get('/api/users/%s/' % self.user.id)
+        with self.assertNumQueries(0):
+            response = client.get('/api/users/%s/' % self.admin.id)
+        self.assertEqual(response.status_code, 401)
+
+    def test_permission_changes_invalidate(self):
+        client = self.client_for(self.user)
+        client.get('/api/users/%s/' % self.user.id)
+
+        self.user.permissions.add(UserPermission.objects.get(name=constants.ADMIN))
+
+        with self.assertNumQueries(3):
+            response = client.get('/api/users/%s/' % self.admin.id)
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_tokens(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + token_for(self.user)[:-2] + 'xx')
+        self.assertEqual(client.get('/api/users/%s/' % self.user.id).status_code, 401)
+
+        expired = jwt.encode({'sub': str(self.user.id), 'exp': int(time.time()) - 1}, SECRET, algorithm='HS256')
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + expired)
+        self.assertEqual(client.get('/api/users/%s/' % self.user.id).status_code, 401)
+
+        self.user.delete()
+        self.assertEqual(self.client_for(self.user).get('/api/users/%s/' % self.user.id).status_code, 401)
+
+
+class UserMutationQueryCountTests(TestCase):
+    """User deletes and updates are single conditional UPDATEs."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='user', password='-', name='User')
+
+    def test_delete(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.user.delete(), 1)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.user.delete(), 0)
+
+    def test_delete_user(self):
+        with self.assertNumQueries(1):
+            user_services.delete_user(str(self.user.id))
+
+        with self.assertNumQueries(1):
+            with self.assertRaises(EntityNotFound):
+                user_services.delete_user(str(self.user.id))
+
+    def test_update_user(self):
+        with self.assertNumQueries(1):
+            user = user_services.update_user(self.user, {'name': 'Changed'})
+        self.assertEqual(user.name, 'Changed')
+        self.assertEqual(User.objects.get(id=self.user.id).name, 'Changed')
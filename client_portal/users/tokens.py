@@ -0,0 +1,59 @@
+import time
+import hashlib
+from threading import Lock
+from collections import OrderedDict
+
+VERIFIED_TOKENS_SIZE = 10000
+VERIFIED_TOKENS_TTL = 60 * 5  # seconds, for tokens without exp
+
+
+class VerifiedTokenCache(object):
+    """
+    Thread safe LRU of tokens whose signature was already verified, by sha256 of the token.
+    Stores the token sub until the token's own exp, so expired tokens are verified (and rejected) again.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8') if isinstance(token, str) else token).digest()
+
+    def get(self, token):
+        """Returns the sub of a verified, not expired token or None."""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                sub, expires = entry
+                if expires > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return sub
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, token, sub, exp=None):
+        expires = exp if exp is not None else time.time() + self.ttl
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (sub, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+verified_tokens = VerifiedTokenCache(VERIFIED_TOKENS_SIZE, VERIFIED_TOKENS_TTL)
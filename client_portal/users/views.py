@@ -1,22 +1,34 @@
 from marshmallow import EXCLUDE
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.core import serializers
+from django.http import Http404
+
+from client_portal.common.renderers import jsonResponse
+from client_portal.common.pagination import pageParams, isExport, ndjsonResponse
+from client_portal.common.responses import fileResponse
 
 from middleware import authorizers
 from middleware.exceptions import HttpError
+from middleware.idempotency import idempotent
 from client_portal.users import services as user_services
 from client_portal.users import schemas as user_schemas
+from client_portal.users.storage import userStorage
 
 
 class User(viewsets.ViewSet):
-    @authorizers.authorized
+    def get_permissions(self):
+        if self.action == 'create':
+            return [authorizers.IsAdmin()]
+        return super(User, self).get_permissions()
+
     def get(self, request, **kwargs):
         try:
-            user = kwargs['context']['user']
-            if user.is_admin:
-                users = user_services.retrieve_users()
-                return Response(serializers.serialize('json', users), status=status.HTTP_200_OK)
+            if authorizers.is_admin(request):
+                if isExport(request):
+                    return ndjsonResponse(request, user_services.export_users())
+                after, limit = pageParams(request)
+                return jsonResponse(user_services.retrieve_users_page(after, limit), status=status.HTTP_200_OK)
             return Response(status=status.HTTP_401_UNAUTHORIZED)
         except HttpError as e:
             return Response(status=e.status_code)
@@ -24,17 +36,16 @@ class User(viewsets.ViewSet):
             print(e)
             return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @authorizers.authorized
     def retrieve(self, request, pk, **kwargs):
         try:
-            user = kwargs['context']['user']
-            if user.id == pk:
-                return Response(serializers.serialize('json', user), status=status.HTTP_200_OK)
-            elif user.is_admin:
+            user = request.user
+            if str(user.id) == pk:
+                return jsonResponse(user_services.user_to_dict(user), status=status.HTTP_200_OK)
+            elif authorizers.is_admin(request):
                 user = user_services.retrieve_users(pk=pk)
                 if user is None:
                     return Response(status=status.HTTP_404_NOT_FOUND)
-                return Response(serializers.serialize('json', user), status=status.HTTP_200_OK)
+                return jsonResponse(user_services.user_to_dict(user), status=status.HTTP_200_OK)
             return Response(status=status.HTTP_401_UNAUTHORIZED)
         except HttpError as e:
             return Response(status=e.status_code)
@@ -42,24 +53,22 @@ class User(viewsets.ViewSet):
             print(e)
             return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @authorizers.admin
+    @idempotent
     def create(self, request):
         try:
             data = user_schemas.CreateUserSchema().load(request.data, unknown=EXCLUDE)
             user = user_services.create_user(data)
-            return Response(serializers.serialize('json', user), status=status.HTTP_200_OK)
+            return jsonResponse(user_services.user_to_dict(user), status=status.HTTP_200_OK)
         except HttpError as e:
             return Response(status=e.status_code)
         except Exception as e:
             print(e)
             return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @authorizers.authorized
     def destroy(self, request, pk, **kwargs):
         try:
-            context = kwargs['context']
-            user = context['user']
-            if user.id != pk and not user.is_admin():
+            user = request.user
+            if str(user.id) != pk and not authorizers.is_admin(request):
                 return Response(status=status.HTTP_401_UNAUTHORIZED)
             user_services.delete_user(pk)
             return Response(status=status.HTTP_200_OK)
@@ -69,17 +78,33 @@ class User(viewsets.ViewSet):
             print(e)
             return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @authorizers.authorized
     def update(self, request, pk, **kwargs):
         try:
-            user = kwargs['context']['user']
-            if user.id != pk:
+            user = request.user
+            if str(user.id) != pk:
                 return Response(status=status.HTTP_401_UNAUTHORIZED)
             data = user_schemas.UpdateUserSchema().load(request.data, unknown=EXCLUDE)
             user = user_services.update_user(user, data)
-            return Response(serializers.serialize('json', user), status=status.HTTP_200_OK)
+            return jsonResponse(user_services.user_to_dict(user), status=status.HTTP_200_OK)
         except HttpError as e:
             return Response(status=e.status_code)
         except Exception as e:
             print(e)
-            return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(detail=True, methods=['get'])
+    def picture(self, request, pk, **kwargs):
+        try:
+            if str(request.user.id) != pk and not authorizers.is_admin(request):
+                return Response(status=status.HTTP_401_UNAUTHORIZED)
+            user = user_services.retrieve_users(pk=pk)
+            if user is None or not user.profile_picture:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+            return fileResponse(userStorage, request, user.profile_picture.name)
+        except Http404:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        except HttpError as e:
+            return Response(status=e.status_code)
+        except Exception as e:
+            print(e)
+            return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
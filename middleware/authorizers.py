@@ -1,59 +1,137 @@
-import functools
-from rest_framework import status
-from rest_framework.response import Response
-from client_portal.users.models import User
-from client_portal.users import constants
+import time
+from threading import Lock
+from collections import OrderedDict
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import BasePermission
+from client_portal.users.models import User, UserPermission
 
+PRINCIPAL_TTL = 60  # seconds, bounds how stale a principal can be on other processes
+PRINCIPAL_CACHE_SIZE = 10000
 
-def authorized(func):
-    @functools.wraps(func)
-    def wrapper_authorized(*args, **kwargs):
-        token = get_token_from_raw_authorization(args[0].headers.get('Authorization', None))
-        if not token:
-            return Response(status=status.HTTP_401_UNAUTHORIZED)
 
-        user_id = User.decode_token(token)
-        if not isinstance(user_id, int):
-            return Response(status=status.HTTP_400_BAD_REQUEST)
+class PrincipalCache(object):
+    """
+    Per process LRU cache of resolved users by id with a TTL.
+    Stores the user fields and its enabled permission names, so a warm request doesn't query the db.
+    """
 
-        user = User.objects.get(id=user_id)
-        if not user:
-            return Response(status=status.HTTP_404_NOT_FOUND)
+    def __init__(self, ttl, size):
+        self.ttl = ttl
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id, principal):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        """Drops a user, or every user if no id is given."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+principals = PrincipalCache(PRINCIPAL_TTL, PRINCIPAL_CACHE_SIZE)
+
+
+# Changes done with queryset.update() don't send signals, they must call principals.invalidate themselves.
+@receiver([post_save, post_delete], sender=User)
+def _user_changed(sender, instance, **kwargs):
+    principals.invalidate(instance.id)
+
+
+@receiver([post_save, post_delete], sender=UserPermission)
+def _permission_changed(sender, instance, **kwargs):
+    # A permission can be shared by any number of users
+    principals.invalidate()
 
-        if kwargs.get("context") is not None:
-            kwargs["context"]["user"] = user
-        else:
-            kwargs["context"] = {"user": user}
 
-        return func(*args, **kwargs)
-    return wrapper_authorized
+@receiver(m2m_changed, sender=User.permissions.through)
+def _user_permissions_changed(sender, instance, reverse, **kwargs):
+    if reverse:
+        principals.invalidate()
+    else:
+        principals.invalidate(instance.id)
 
 
-def admin(func):
-    @functools.wraps(func)
-    def wrapper_authorized(*args, **kwargs):
-        token = get_token_from_raw_authorization(args[0].headers.get('Authorization', None))
+def load_user(user_id):
+    """
+    Returns the non deleted user with its permission names loaded, or None.
+    Served from the principals cache when possible.
+    """
+    principal = principals.get(user_id)
+    if principal is not None:
+        field_names, values, permission_names = principal
+        user = User.from_db('default', field_names, values)
+        user._permission_names = permission_names
+        return user
+
+    user = User.objects.filter(id=user_id, deleted__isnull=True).first()
+    if user is None:
+        return None
+
+    field_names = [field.attname for field in User._meta.concrete_fields]
+    principals.set(user_id, (field_names, [getattr(user, name) for name in field_names], user.permission_names()))
+    return user
+
+
+class TokenAuthentication(BaseAuthentication):
+    """
+    Resolves the user of the bearer token once per request, DRF keeps it as request.user.
+    Requests without a token are left anonymous for the permission classes to decide.
+    """
+
+    def authenticate(self, request):
+        token = get_token_from_raw_authorization(request.headers.get('Authorization', None))
         if not token:
-            return Response(status=status.HTTP_401_UNAUTHORIZED)
+            return None
 
         user_id = User.decode_token(token)
         if not isinstance(user_id, int):
-            return Response(status=status.HTTP_400_BAD_REQUEST)
+            raise AuthenticationFailed(user_id)
 
-        user = User.objects.get(id=user_id)
+        user = load_user(user_id)
         if not user:
-            return Response(status=status.HTTP_404_NOT_FOUND)
-
-        permissions = User.permissions
-        for permission in permissions.iterator():
-            if permission.enabled and permission.name == constants.ADMIN:
-                if kwargs.get("context") is not None:
-                    kwargs["context"]["user"] = user
-                else:
-                    kwargs["context"] = {"user": user}
-                return func(*args, **kwargs)
-        return Response(status=status.HTTP_401_UNAUTHORIZED)
-    return wrapper_authorized
+            raise AuthenticationFailed()
+
+        return user, token
+
+    def authenticate_header(self, request):
+        # Makes DRF answer 401 instead of 403 for missing or invalid tokens
+        return 'Bearer'
+
+
+def is_admin(request):
+    """Whether the request user is an admin, computed once per request."""
+    if not hasattr(request, '_is_admin'):
+        user = request.user
+        request._is_admin = bool(user and user.is_authenticated and user.is_admin())
+    return request._is_admin
+
+
+class IsAdmin(BasePermission):
+    def has_permission(self, request, view):
+        return is_admin(request)
 
 
 def get_token_from_raw_authorization(raw_token):
@@ -0,0 +1,92 @@
+import hashlib
+from datetime import timedelta
+from functools import wraps
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from client_portal.common.renderers import dumps
+from client_portal.idempotency.models import IdempotencyKey
+from client_portal.idempotency import services as idempotency_services
+
+
+def _digest(*parts):
+    return hashlib.sha256(b'\0'.join(
+        part if isinstance(part, bytes) else str(part).encode('utf-8') for part in parts
+    )).hexdigest()
+
+
+def _content(response):
+    # DRF responses are rendered after the view returns
+    if isinstance(response, Response):
+        return dumps(response.data) if response.data is not None else b'', 'application/json'
+    return response.content, response['Content-Type']
+
+
+def _replay(record, fingerprint):
+    # Reusing a key for another body, or while its request still runs, is a conflict, not a retry
+    if record is None or record.fingerprint != fingerprint or record.status is None:
+        return Response(status=status.HTTP_409_CONFLICT)
+    response = HttpResponse(bytes(record.body), status=record.status, content_type=record.content_type)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """
+    Makes a POST view safe to retry with an Idempotency-Key header: the first request with a key runs and
+    its response is stored for IDEMPOTENCY_KEY_TTL seconds, retries get that response without running the
+    view again. Requests without the header run as usual.
+    The key row is inserted before running the view, in the same transaction, so a concurrent duplicate
+    waits on the unique constraint and then replays the response of the first one.
+    Server errors aren't stored, so the request can be retried with the same key.
+    """
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        header = request.headers.get('Idempotency-Key')
+        if not header:
+            return view(self, request, *args, **kwargs)
+
+        key = _digest(request.user.id, request.method, request.path, header)
+        fingerprint = _digest(request.body)
+        now = timezone.now()
+
+        record = IdempotencyKey.objects.filter(key=key, expires__gt=now).first()
+        if record is not None:
+            return _replay(record, fingerprint)
+
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.filter(key=key, expires__lte=now).delete()
+                try:
+                    with transaction.atomic():
+                        record = IdempotencyKey.objects.create(
+                            key=key, fingerprint=fingerprint,
+                            expires=now + timedelta(seconds=idempotency_services.IDEMPOTENCY_KEY_TTL),
+                        )
+                except IntegrityError:
+                    record = None
+
+                if record is not None:
+                    # A view that handled a database error only rolls back its own savepoint, the key can
+                    # still be stored
+                    with transaction.atomic():
+                        response = view(self, request, *args, **kwargs)
+                    if response.status_code >= 500:
+                        transaction.set_rollback(True)
+                        return response
+
+                    record.body, record.content_type = _content(response)
+                    record.status = response.status_code
+                    record.save(update_fields=['status', 'body', 'content_type'])
+                    idempotency_services.schedule_purge()
+                    return response
+        except IntegrityError:
+            # Deferred constraints (e.g. foreign keys on postgres) fail on commit, the view's writes and the key
+            # are rolled back, as services do with any integrity error
+            return Response(status=status.HTTP_409_CONFLICT)
+
+        return _replay(IdempotencyKey.objects.filter(key=key).first(), fingerprint)
+    return wrapper